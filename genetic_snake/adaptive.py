@@ -0,0 +1,90 @@
+"""
+Self-adaptive crossover and mutation rates.
+
+Every offspring remembers the fitness of the parent it was copied from and
+which operators changed it. After evaluation, the gain of an offspring is
+the fitness gained over the parent per simulated turn spent. Plain copies
+of the same generation give the baseline: parents were selected for a
+lucky evaluation, so copies lose fitness on average. An operator is judged
+by Welch's t statistic of its gains against the copies, rates of operators
+doing better grow, the others shrink. Rare operators collect gains over
+several generations until there are enough to judge them.
+"""
+import math
+from collections import namedtuple
+from typing import Dict, Iterable, List
+
+CROSSOVER = "crossover"
+MUTATION = "mutation"
+OPERATORS = (CROSSOVER, MUTATION)
+
+# how an offspring was made, kept until it is evaluated
+Origin = namedtuple("Origin", "parent_fitness operators")
+
+
+def _mean_error(values: List[float]):
+    """
+    Mean and squared standard error of the mean.
+    """
+    mean = sum(values) / len(values)
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+    return mean, variance / len(values)
+
+
+class OperatorController:
+    SMOOTHING = 0.3  # weight of the newest generation in operator quality
+    LEARNING_RATE = 0.3  # rate is multiplied by at most exp(LEARNING_RATE) per generation
+    MIN_SAMPLES = 5  # offspring an operator (and copies) need to be judged
+    SIGNIFICANCE = 2.0  # t statistic of full quality
+
+    def __init__(self, rates: Dict[str, float], min_rate: float = 0.01, max_rate: float = 0.5):
+        """
+        :param rates: starting probability of each operator
+        """
+        self.rates = dict(rates)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.quality = {op: 0.0 for op in OPERATORS}  # -1 to 1
+        self._origins = {}  # type: Dict[int, Origin]
+        self._gains = {op: [] for op in OPERATORS + (None,)}  # not judged yet, None for plain copies
+
+    def record(self, uid: int, parent_fitness: float, operators: Iterable[str]):
+        self._origins[uid] = Origin(parent_fitness, frozenset(operators))
+
+    def update(self, offspring: List) -> Dict[str, float]:
+        """
+        Adapt rates to evaluated offspring, forget unevaluated ones.
+        :return: new rates
+        """
+        gains = self._gains
+        for ind in offspring:
+            origin = self._origins.get(ind.uid)
+            if origin is None:
+                continue
+            gain = (ind.fitness - origin.parent_fitness) / max(1, ind.turns)
+            for op in origin.operators or (None,):
+                gains[op].append(gain)
+        self._origins.clear()
+
+        if len(gains[None]) < self.MIN_SAMPLES:
+            return self.rates
+        copies_mean, copies_error = _mean_error(gains[None])
+        judged = False
+        for op in OPERATORS:
+            if len(gains[op]) < self.MIN_SAMPLES:
+                continue
+            mean, error = _mean_error(gains[op])
+            gains[op] = []
+            judged = True
+            t = (mean - copies_mean) / (math.sqrt(error + copies_error) or 1.0)
+            quality = max(-1.0, min(1.0, t / self.SIGNIFICANCE))
+            self.quality[op] += self.SMOOTHING * (quality - self.quality[op])
+            rate = self.rates[op] * math.exp(self.LEARNING_RATE * self.quality[op])
+            self.rates[op] = min(self.max_rate, max(self.min_rate, rate))
+        if judged:
+            gains[None] = []
+        return self.rates
+
+    def __str__(self):
+        return "Operators: " + ", ".join(f"{op} {self.rates[op]:.3f} (quality {self.quality[op]:+.2f})"
+                                         for op in OPERATORS)
@@ -0,0 +1,190 @@
+"""
+SQLite archive of every individual evaluated during evolution.
+"""
+import sqlite3
+import struct
+import threading
+import time
+from typing import List, Sequence, Tuple
+from .tree import EpisodeResult, Individual, Population
+from . import encoding
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS individual (
+    run INTEGER NOT NULL REFERENCES run(id),
+    id INTEGER NOT NULL,
+    generation INTEGER NOT NULL,
+    fitness REAL NOT NULL,
+    score INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    tree BLOB NOT NULL,
+    parent1 INTEGER,
+    parent2 INTEGER,
+    episodes BLOB,
+    evaluated INTEGER NOT NULL DEFAULT 1,  -- evaluated in this generation
+    member INTEGER NOT NULL DEFAULT 1,  -- in the population after selection
+    PRIMARY KEY (run, generation, id)
+);
+CREATE INDEX IF NOT EXISTS individual_generation ON individual (run, generation, fitness DESC);
+CREATE INDEX IF NOT EXISTS individual_fitness ON individual (run, fitness DESC);
+"""
+# columns added since the first version, with their definition
+_ADDED_COLUMNS = (
+    ("episodes", "BLOB"),
+    ("evaluated", "INTEGER NOT NULL DEFAULT 1"),
+    ("member", "INTEGER NOT NULL DEFAULT 1"),
+)
+_INSERT = ("INSERT INTO individual (run, id, generation, fitness, score, turns, tree, parent1, parent2, "
+           "episodes, evaluated, member) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+           "ON CONFLICT (run, generation, id) DO UPDATE SET ")
+# evaluation games of an individual: seed (uint64), width, height (uint16), score, turns (uint32)
+_EPISODE = struct.Struct("<QHHII")
+
+
+def pack_episodes(episodes: Sequence[EpisodeResult]) -> bytes:
+    return b"".join(_EPISODE.pack(*episode) for episode in episodes)
+
+
+def unpack_episodes(data: bytes) -> List[EpisodeResult]:
+    return [EpisodeResult(*values) for values in _EPISODE.iter_unpack(data)]
+
+
+class Archive:
+    """
+    Stores every individual evaluated in a generation (including offspring
+    rejected by selection) and every member of the population after selection,
+    one row per individual and generation with both roles flagged. Individuals
+    surviving several generations are members once per generation. Every query
+    is limited to one run, the latest one started by this archive by default.
+    Safe to share between threads.
+    """
+
+    def __init__(self, filename: str = "archive.sqlite"):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        # readers in other processes (GUI) do not block the writer
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self.connection:
+            self.connection.executescript(SCHEMA)
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(individual)")]
+            for name, definition in _ADDED_COLUMNS:
+                if name not in columns:
+                    # archive written by an older version
+                    self.connection.execute(f"ALTER TABLE individual ADD COLUMN {name} {definition}")
+        self.run = self._latest_run()
+
+    def _latest_run(self):
+        row = self.connection.execute("SELECT MAX(id) FROM run").fetchone()
+        return row[0]
+
+    def start_run(self) -> int:
+        with self._lock, self.connection:
+            cursor = self.connection.execute("INSERT INTO run (started) VALUES (?)", (time.time(),))
+        self.run = cursor.lastrowid
+        return self.run
+
+    def _add(self, individuals: Sequence[Individual], generation: int, evaluated: bool, update: str):
+        if self.run is None:
+            self.start_run()
+        rows = [
+            (self.run, ind.uid, generation, ind.fitness, ind.score, ind.turns,
+             encoding.dumps(ind.root),
+             ind.parents[0] if len(ind.parents) > 0 else None,
+             ind.parents[1] if len(ind.parents) > 1 else None,
+             pack_episodes(ind.episodes), int(evaluated), int(not evaluated))
+            for ind in individuals
+        ]
+        with self._lock, self.connection:
+            self.connection.executemany(_INSERT + update, rows)
+
+    def add_evaluated(self, individuals: Sequence[Individual], generation: int):
+        """
+        Store individuals just evaluated, before selection.
+        """
+        self._add(individuals, generation, True,
+                  "evaluated = 1, fitness = excluded.fitness, score = excluded.score, "
+                  "turns = excluded.turns, episodes = excluded.episodes")
+
+    def add_population(self, population: Population, generation: int):
+        """
+        Mark population after selection, individuals not evaluated in this
+        generation (survivors) are stored too.
+        """
+        self._add(population.pop, generation, False, "member = 1")
+
+    def _individuals(self, query, params) -> List[Individual]:
+        with self._lock:
+            rows = self.connection.execute(query, params).fetchall()
+        individuals = []
+        for uid, fitness, score, turns, tree, parent1, parent2, episodes in rows:
+            ind = Individual(encoding.loads(tree))
+            ind.uid = uid
+            ind.fitness = fitness
+            ind.score = score
+            ind.turns = turns
+            ind.parents = tuple(p for p in (parent1, parent2) if p is not None)
+            ind.episodes = unpack_episodes(episodes or b"")
+            individuals.append(ind)
+        return individuals
+
+    _COLUMNS = "id, fitness, score, turns, tree, parent1, parent2, episodes"
+
+    def best(self, generation: int) -> Individual:
+        found = self._individuals(
+            f"SELECT {self._COLUMNS} FROM individual WHERE run = ? AND generation = ? AND member = 1 "
+            "ORDER BY fitness DESC LIMIT 1", (self.run, generation))
+        return found[0] if found else None
+
+    def top(self, k: int, generation: int = None) -> List[Individual]:
+        """
+        Return k best individuals evaluated in the run or of one generation's population.
+        """
+        if generation is None:
+            return self._individuals(
+                f"SELECT {self._COLUMNS} FROM individual WHERE run = ? AND evaluated = 1 "
+                "ORDER BY fitness DESC LIMIT ?", (self.run, k))
+        return self._individuals(
+            f"SELECT {self._COLUMNS} FROM individual WHERE run = ? AND generation = ? AND member = 1 "
+            "ORDER BY fitness DESC LIMIT ?", (self.run, generation, k))
+
+    def population(self, generation: int) -> Population:
+        pop = Population()
+        for ind in self._individuals(
+                f"SELECT {self._COLUMNS} FROM individual WHERE run = ? AND generation = ? AND member = 1",
+                (self.run, generation)):
+            pop.append(ind)
+        return pop
+
+    def evaluated(self, generation: int) -> List[Individual]:
+        """
+        Individuals evaluated in a generation, including those not selected.
+        """
+        return self._individuals(
+            f"SELECT {self._COLUMNS} FROM individual WHERE run = ? AND generation = ? AND evaluated = 1",
+            (self.run, generation))
+
+    def best_per_generation(self) -> List[Tuple[int, float, int, int]]:
+        """
+        Return (generation, fitness, score, turns) of the best individual of each generation.
+        """
+        with self._lock:
+            return self.connection.execute(
+                "SELECT generation, MAX(fitness), score, turns FROM individual "
+                "WHERE run = ? AND member = 1 GROUP BY generation ORDER BY generation", (self.run,)).fetchall()
+
+    def parents(self, ind: Individual) -> List[Individual]:
+        if not ind.parents:
+            return []
+        marks = ", ".join("?" * len(ind.parents))
+        return self._individuals(
+            f"SELECT {self._COLUMNS} FROM individual WHERE run = ? AND id IN ({marks}) GROUP BY id",
+            (self.run,) + ind.parents)
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,197 @@
+"""
+Time-to-target benchmark against the stored results.
+
+Every results_* directory holds the config of an old run (config.txt) and
+its per-generation curves (generation;avg_fitness;avg_score;best_fitness;best_score).
+The benchmark runs Evolution with each stored config and fixed seeds and
+reports wall time, CPU time and simulated turns needed to reach best-score
+targets, next to the generations the stored runs needed.
+
+Example:
+    python -m genetic_snake.benchmark --seeds 0 1 2 --targets 10 30 60 --out benchmark.txt
+"""
+import argparse
+import glob
+import os
+import random
+import statistics
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from .tree import Evolution, Individual, LogHandler
+from . import snake
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results_*")
+FUNCTION_NAMES = {"ahead": snake.AHEAD, "visible": snake.VISIBLE, "nearby": snake.NEARBY}
+TARGETS = (10, 30, 60)
+
+# one logged generation of a benchmark run, times in seconds from the start
+Record = namedtuple("Record", "generation wall cpu turns avg_fitness avg_score best_fitness best_score")
+
+
+def read_config(directory: str) -> Tuple[dict, dict]:
+    """
+    Parse config.txt of stored results.
+    :return: Individual class attributes and Evolution parameters
+    """
+    individual = {}
+    evolution = {}
+    board = {}
+    with open(os.path.join(directory, "config.txt")) as handle:
+        for line in handle:
+            name, _, value = (part.strip() for part in line.partition("="))
+            if not value:
+                continue
+            if name == "functions":
+                evolution["FUNCTION_TYPES"] = tuple(FUNCTION_NAMES[f.strip()] for f in value.split(","))
+            elif name in ("WIDTH", "HEIGHT"):
+                board[name] = int(value)
+            elif hasattr(Individual, name):
+                individual[name] = int(value)
+            elif name.isupper() and hasattr(Evolution, name):
+                evolution[name] = type(getattr(Evolution, name))(float(value))
+    if board:
+        evolution["EVAL_BOARDS"] = ((board["WIDTH"], board["HEIGHT"]),)
+    return individual, evolution
+
+
+def read_curves(directory: str) -> List[List[Tuple[float, float, float, int]]]:
+    """
+    Stored curves, rows of (avg_fitness, avg_score, best_fitness, best_score) by generation.
+    """
+    curves = []
+    for filename in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        if os.path.basename(filename) == "config.txt":
+            continue
+        curve = []
+        with open(filename) as handle:
+            for line in handle:
+                if line.strip():
+                    _, avg_fitness, avg_score, best_fitness, best_score = line.split(";")
+                    curve.append((float(avg_fitness), float(avg_score), float(best_fitness), int(best_score)))
+        curves.append(curve)
+    return curves
+
+
+class RecordHandler(LogHandler):
+    def __init__(self, evolution: Evolution):
+        self.evolution = evolution
+        self.start = time.monotonic()
+        self.cpu_start = time.process_time()
+        self.records = []  # type: List[Record]
+
+    def add_population(self, population, generation):
+        best = population.get_best()
+        self.records.append(Record(generation, time.monotonic() - self.start,
+                                   time.process_time() - self.cpu_start, self.evolution.simulated_turns,
+                                   population.get_avg_fitness(), population.get_avg_score(),
+                                   best.fitness, best.score))
+
+
+def run_one(individual: dict, config: dict, seed: int) -> List[Record]:
+    """
+    Run evolution with stored config and seed. Executed in pool process.
+    """
+    for name, value in individual.items():
+        setattr(Individual, name, value)
+    random.seed(seed)
+    evolution = Evolution(**config)
+    handler = RecordHandler(evolution)
+    evolution.run(handler)
+    return handler.records
+
+
+def time_to_target(records: List[Record], target: int) -> Optional[Record]:
+    for record in records:
+        if record.best_score >= target:
+            return record
+    return None
+
+
+def stored_generations(curves, target: int) -> Optional[float]:
+    """
+    Mean generation in which stored runs reached target, None if none did.
+    """
+    reached = [next(g for g, row in enumerate(curve) if row[3] >= target)
+               for curve in curves if any(row[3] >= target for row in curve)]
+    return statistics.fmean(reached) if reached else None
+
+
+def run_benchmark(directories: List[str], seeds: List[int], processes: int = None,
+                  overrides: dict = None) -> Dict[str, List[List[Record]]]:
+    """
+    :param overrides: Evolution parameters replacing stored ones (e.g. shorter runs)
+    :return: directory -> records of every seed
+    """
+    overrides = {} if overrides is None else overrides
+    with ProcessPoolExecutor(processes) as pool:
+        futures = {}
+        for directory in directories:
+            individual, config = read_config(directory)
+            futures[directory] = [pool.submit(run_one, individual, {**config, **overrides}, seed)
+                                  for seed in seeds]
+        return {directory: [f.result() for f in runs] for directory, runs in futures.items()}
+
+
+def _mean(values) -> str:
+    values = [v for v in values if v is not None]
+    return f"{statistics.fmean(values):.1f}" if values else "-"
+
+
+def report(results: Dict[str, List[List[Record]]], targets=TARGETS) -> List[List[str]]:
+    """
+    One row per stored results directory, means over seeds. Time to target
+    counts only the seeds that reached it (reached/seeds is shown).
+    Quality per CPU second is the final best score divided by CPU time.
+    """
+    columns = ["results", "seeds", "generations", "best_score", "stored_best_score", "score_per_cpu_s"]
+    for target in targets:
+        columns += [f"reached_{target}", f"gen_{target}", f"stored_gen_{target}",
+                    f"wall_{target}", f"cpu_{target}", f"turns_{target}"]
+    rows = [columns]
+    for directory, runs in results.items():
+        curves = read_curves(directory)
+        generations = min(len(r) for r in runs) - 1
+        stored_best = [curve[min(generations, len(curve) - 1)][3] for curve in curves]
+        row = [os.path.basename(directory), str(len(runs)), str(generations),
+               _mean(r[-1].best_score for r in runs), _mean(stored_best),
+               f"{statistics.fmean(r[-1].best_score / r[-1].cpu for r in runs):.3f}"]
+        for target in targets:
+            hits = [time_to_target(r, target) for r in runs]
+            reached = [h for h in hits if h is not None]
+            stored = stored_generations(curves, target)
+            row += [f"{len(reached)}/{len(runs)}",
+                    _mean(h.generation for h in reached),
+                    "-" if stored is None else f"{stored:.1f}",
+                    _mean(h.wall for h in reached),
+                    _mean(h.cpu for h in reached),
+                    _mean(h.turns for h in reached)]
+        rows.append(row)
+    return rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Time-to-target benchmark against stored results.")
+    arg_parser.add_argument("--results", nargs="*", default=sorted(glob.glob(RESULTS)),
+                            help="stored results directories, all by default")
+    arg_parser.add_argument("--seeds", nargs="*", type=int, default=[0, 1, 2])
+    arg_parser.add_argument("--targets", nargs="*", type=int, default=list(TARGETS))
+    arg_parser.add_argument("--generations", type=int, default=None, help="override stored GENERATIONS")
+    arg_parser.add_argument("--processes", type=int, default=None)
+    arg_parser.add_argument("--out", default="benchmark.txt")
+    args = arg_parser.parse_args()
+
+    overrides = {} if args.generations is None else {"GENERATIONS": args.generations}
+    results = run_benchmark(args.results, args.seeds, args.processes, overrides)
+    rows = report(results, args.targets)
+    with open(args.out, "w") as handle:
+        for row in rows:
+            handle.write(";".join(row) + "\n")
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+
+
+if __name__ == '__main__':
+    main()
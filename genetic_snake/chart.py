@@ -0,0 +1,74 @@
+"""
+Downsampling of long per-generation curves for plotting.
+
+Largest-Triangle-Three-Buckets (LTTB, Steinarsson 2013) keeps from every
+bucket the point forming the largest triangle with its neighbours, so peaks
+and drops survive when thousands of generations are drawn with a few
+hundred points. A Curve keeps at most 2 * size points and downsamples them
+back to size once full: adding a generation is amortized O(1) and drawing
+costs the same for 100 or 100,000 generations.
+"""
+from typing import List, Sequence, Tuple
+
+Point = Tuple[float, float]
+
+
+def lttb(points: Sequence[Point], size: int) -> List[Point]:
+    """
+    Downsample points sorted by x to at most size points, first and last are kept.
+    Buckets span equal ranges of x, so densely sampled parts (recent generations
+    not downsampled yet) do not take more points than the rest.
+    """
+    size = max(3, size)
+    if len(points) <= size:
+        return list(points)
+    first, last = points[0], points[-1]
+    inner = points[1:-1]
+    count = size - 2
+    start = inner[0][0]
+    width = (inner[-1][0] - start) / count or 1.0
+    buckets = []
+    index = -1
+    for p in inner:
+        i = min(count - 1, int((p[0] - start) / width))
+        if i != index:
+            buckets.append([])
+            index = i
+        buckets[-1].append(p)
+
+    result = [first]
+    a = first
+    for i, bucket in enumerate(buckets):
+        if i + 1 < len(buckets):
+            following = buckets[i + 1]
+            cx = sum(p[0] for p in following) / len(following)
+            cy = sum(p[1] for p in following) / len(following)
+        else:
+            cx, cy = last
+        ax, ay = a
+        # twice the triangle area, sign does not matter
+        a = max(bucket, key=lambda p: abs((ax - cx) * (p[1] - ay) - (ax - p[0]) * (cy - ay)))
+        result.append(a)
+    result.append(last)
+    return result
+
+
+class Curve:
+    """
+    Points of a growing curve, downsampled to size whenever there are twice as many.
+    """
+
+    def __init__(self, size: int = 300):
+        self.size = size
+        self.points = []  # type: List[Point]
+
+    def __len__(self):
+        return len(self.points)
+
+    def add(self, x: float, y: float):
+        self.points.append((x, y))
+        if len(self.points) >= 2 * self.size:
+            self.points = lttb(self.points, self.size)
+
+    def clear(self):
+        self.points = []
@@ -0,0 +1,56 @@
+"""
+Diversity of a population: duplicate trees and duplicate behaviours.
+
+Trees are hash-consed, so equal trees are the same Node object and unique
+trees are counted by identity. Behaviour of a tree is fingerprinted by the
+moves it chooses on the fixed probe game states of the surrogate module;
+trees with equal fingerprints play (almost always) the same way although
+they differ in structure.
+"""
+import weakref
+from collections import namedtuple
+from typing import Iterable, List, Sequence, Set
+from .surrogate import Probe, probe_states
+from .tree import Individual, Node
+
+# diversity of a generation, replaced and restarted count individuals
+# replaced by fresh random ones as duplicates and in a restart
+Diversity = namedtuple("Diversity", "generation size unique_trees unique_behaviours replaced restarted")
+
+
+class DiversityTracker:
+    PROBES = 64
+
+    def __init__(self, probes: List[Probe] = None):
+        self.probes = probe_states(self.PROBES) if probes is None else probes
+        self._fingerprints = weakref.WeakKeyDictionary()  # root -> moves on probes
+
+    def fingerprint(self, root: Node) -> bytes:
+        cached = self._fingerprints.get(root)
+        if cached is None:
+            cached = bytes(root.evaluate(probe).type for probe in self.probes)
+            self._fingerprints[root] = cached
+        return cached
+
+    def unique_trees(self, individuals: Iterable[Individual]) -> int:
+        return len({id(ind.root) for ind in individuals})
+
+    def unique_behaviours(self, individuals: Iterable[Individual]) -> int:
+        return len({self.fingerprint(ind.root) for ind in individuals})
+
+    def measure(self, individuals: Sequence[Individual], generation: int, replaced: int = 0) -> Diversity:
+        return Diversity(generation, len(individuals), self.unique_trees(individuals),
+                         self.unique_behaviours(individuals), replaced, 0)
+
+    def duplicates(self, individuals: Sequence[Individual], seen: Iterable[Individual] = ()) -> List[int]:
+        """
+        Indices of individuals whose tree is already in seen or earlier in individuals.
+        """
+        roots = {id(ind.root) for ind in seen}  # type: Set[int]
+        found = []
+        for i, ind in enumerate(individuals):
+            if id(ind.root) in roots:
+                found.append(i)
+            else:
+                roots.add(id(ind.root))
+        return found
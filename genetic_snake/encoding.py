@@ -0,0 +1,226 @@
+"""
+Compact, pickle-free encoding of decision trees and populations.
+
+Every node is identified by a small integer code. Terminals use their
+Rotation type (0-2), functions use 3 + index into FUNCTIONS.
+
+Text form is an s-expression using the node names of Node.tree_string:
+    (IF-FOOD-next-RIGHT (IF-SNAKE-visible-LEFT AHEAD RIGHT) RIGHT)
+Binary form stores one byte per node in preorder.
+
+Population files start with a versioned header and contain one record per
+individual, so they can be written and read as a stream.
+"""
+import struct
+from typing import Iterable, Iterator, List, BinaryIO, TextIO
+from .tree import Node, Function, Rotation, Individual, Generator
+from . import snake
+
+VERSION = 1
+MAGIC = b"GSNK"
+TEXT_HEADER = "# genetic_snake"
+
+TERMINALS = [Rotation(t) for t in Rotation.TYPES]
+FUNCTIONS = []  # type: List[Function]
+for _func_type in Function.TYPES:
+    if _func_type == snake.NEARBY:
+        _is_funcs = Function.NEARBY_FUNCTIONS
+    else:
+        _is_funcs = Function.IS_FUNCTIONS
+    for _is_func in _is_funcs:
+        for _rotation in Generator.ROTATIONS:
+            FUNCTIONS.append(Function(Rotation(_rotation), _func_type, _is_func,
+                                      Function.FUNCTIONS_STR[_is_func]))
+
+FIRST_FUNCTION = len(TERMINALS)
+DATA = TERMINALS + FUNCTIONS
+NAME_TO_CODE = {str(data): code for code, data in enumerate(DATA)}
+_FUNCTION_CODES = {(f.func_type, f.is_func, f.rotation.type): FIRST_FUNCTION + i
+                   for i, f in enumerate(FUNCTIONS)}
+
+# fitness, score, turns, number of nodes
+_RECORD = struct.Struct("<dIII")
+_HEADER = MAGIC + bytes([VERSION])
+
+
+def code_of(data) -> int:
+    if data.is_terminal():
+        return data.type
+    return _FUNCTION_CODES[(data.func_type, data.is_func, data.rotation.type)]
+
+
+def to_codes(root: Node) -> List[int]:
+    """
+    Return node codes of the tree in preorder.
+    """
+    codes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        codes.append(code_of(node.data))
+        if node.right is not None:
+            stack.append(node.right)
+        if node.left is not None:
+            stack.append(node.left)
+    return codes
+
+
+def from_codes(codes: Iterable[int]) -> Node:
+    """
+    Build tree from node codes in preorder.
+    """
+    codes = list(codes)
+    stack = []  # built subtrees, built bottom-up from the last code
+    for code in reversed(codes):
+        if not 0 <= code < len(DATA):
+            raise ValueError(f"Unknown node code {code}")
+        if code < FIRST_FUNCTION:
+            stack.append(Node(DATA[code]))
+        elif len(stack) < 2:
+            raise ValueError("Incomplete tree")
+        else:
+            left = stack.pop()
+            right = stack.pop()
+            stack.append(Node(DATA[code], left, right))
+    if not stack:
+        raise ValueError("Incomplete tree")
+    if len(stack) > 1:
+        raise ValueError("Trailing data after complete tree")
+    return stack[0]
+
+
+def dumps(root: Node) -> bytes:
+    """
+    Binary form of a single tree (no header).
+    """
+    return bytes(to_codes(root))
+
+
+def loads(data: bytes) -> Node:
+    return from_codes(data)
+
+
+def to_text(root: Node) -> str:
+    """
+    S-expression form of a single tree.
+    """
+    parts = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            parts.append(")")
+        elif node.data.is_terminal():
+            parts.append(str(node.data))
+        else:
+            parts.append("(" + str(node.data))
+            stack.append(None)
+            stack.append(node.right)
+            stack.append(node.left)
+    return " ".join(parts).replace(" )", ")")
+
+
+def from_text(text: str) -> Node:
+    codes = []
+    expecting_function = False
+    children = []  # number of children seen by each open function
+    for token in text.replace("(", " ( ").replace(")", " ) ").split():
+        if token == "(":
+            if expecting_function:
+                raise ValueError("Expected function name after '('")
+            expecting_function = True
+            continue
+        if token == ")":
+            if expecting_function or not children or children.pop() != 2:
+                raise ValueError("Unbalanced ')'")
+            continue
+        code = NAME_TO_CODE.get(token)
+        if code is None:
+            raise ValueError(f"Unknown node {token!r}")
+        if expecting_function != (code >= FIRST_FUNCTION):
+            raise ValueError(f"Misplaced node {token!r}")
+        if children:
+            children[-1] += 1
+        if expecting_function:
+            children.append(0)
+            expecting_function = False
+        codes.append(code)
+    if expecting_function or children:
+        raise ValueError("Unbalanced '('")
+    return from_codes(codes)
+
+
+def _individual(root: Node, fitness: float, score: int, turns: int) -> Individual:
+    ind = Individual(root)
+    ind.fitness = fitness
+    ind.score = score
+    ind.turns = turns
+    return ind
+
+
+def dump(individuals: Iterable[Individual], handle: BinaryIO):
+    """
+    Write individuals to binary stream. Works with any iterable.
+    """
+    handle.write(_HEADER)
+    for ind in individuals:
+        codes = dumps(ind.root)
+        handle.write(_RECORD.pack(ind.fitness, ind.score, ind.turns, len(codes)))
+        handle.write(codes)
+
+
+def iter_load(handle: BinaryIO) -> Iterator[Individual]:
+    """
+    Read individuals from binary stream one at a time.
+    """
+    header = handle.read(len(_HEADER))
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a genetic_snake file")
+    if header[len(MAGIC):] != bytes([VERSION]):
+        raise ValueError(f"Unsupported version {header[len(MAGIC):]!r}")
+    while True:
+        record = handle.read(_RECORD.size)
+        if not record:
+            return
+        if len(record) != _RECORD.size:
+            raise ValueError("Truncated record")
+        fitness, score, turns, size = _RECORD.unpack(record)
+        codes = handle.read(size)
+        if len(codes) != size:
+            raise ValueError("Truncated record")
+        yield _individual(loads(codes), fitness, score, turns)
+
+
+def iter_load_file(filename: str) -> Iterator[Individual]:
+    """
+    Stream individuals from file. Detects binary and text format.
+    """
+    with open(filename, 'rb') as handle:
+        if handle.read(len(MAGIC)) == MAGIC:
+            handle.seek(0)
+            yield from iter_load(handle)
+            return
+    with open(filename, 'r', encoding='utf-8') as handle:
+        yield from iter_load_text(handle)
+
+
+def dump_text(individuals: Iterable[Individual], handle: TextIO):
+    """
+    Write individuals to text stream, one per line.
+    """
+    handle.write(f"{TEXT_HEADER} {VERSION}\n")
+    for ind in individuals:
+        handle.write(f"{ind.fitness!r} {ind.score} {ind.turns} {to_text(ind.root)}\n")
+
+
+def iter_load_text(handle: TextIO) -> Iterator[Individual]:
+    header = handle.readline().split()
+    if header[:-1] != TEXT_HEADER.split():
+        raise ValueError("Not a genetic_snake file")
+    if header[-1] != str(VERSION):
+        raise ValueError(f"Unsupported version {header[-1]!r}")
+    for line in handle:
+        if not line.strip():
+            continue
+        fitness, score, turns, tree = line.split(maxsplit=3)
+        yield _individual(from_text(tree), float(fitness), int(score), int(turns))
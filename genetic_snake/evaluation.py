@@ -0,0 +1,388 @@
+"""
+Fitness evaluation backends.
+
+Every backend evaluates a batch of individuals, each with its own list of
+evaluation games (tree.Episode), and stores the results with
+Individual.set_results.
+
+Wire format used by server.EvaluationServer (all little-endian):
+    request:  per tree     number of nodes (uint32), number of episodes (uint16), node codes,
+              per episode  seed (uint64), width (uint16), height (uint16)
+    response: per episode  score (uint32), turns (uint32)
+
+Shared memory layout used by SharedMemoryEvaluator (native byte order):
+    jobs:     per episode  tree offset, tree length (uint32), seed (uint64), width, height (uint16),
+              then node codes of distinct trees
+    results:  per episode  score (uint32), turns (uint32)
+
+Run `python -m genetic_snake.evaluation --threads 1 2 4 8` to measure how
+ThreadPoolEvaluator scales on the running interpreter (GIL or free-threaded).
+"""
+import argparse
+import http.client
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Sequence, Tuple
+from .tree import Episode, EpisodeResult, Evolution, Individual, LocalEvaluator, seeded
+from . import encoding, novelty
+
+PATH = "/evaluate"
+CONTENT_TYPE = "application/octet-stream"
+_TREE = struct.Struct("<IH")
+_EPISODE = struct.Struct("<QHH")
+_RESPONSE = struct.Struct("<II")
+_JOB = struct.Struct("=IIQHH")
+_RESULT = struct.Struct("=II")
+
+
+# shared memory blocks attached in a worker process, by name
+_attached = {}  # type: Dict[str, SharedMemory]
+
+
+def _attach(name: str) -> SharedMemory:
+    block = _attached.get(name)
+    if block is None:
+        block = SharedMemory(name)
+        _attached[name] = block
+    return block
+
+
+def evaluate_shared(jobs_name: str, results_name: str, start: int, stop: int):
+    """
+    Play games start to stop of the jobs block, write results to the results
+    block. Used by worker processes, blocks stay attached between calls.
+    """
+    for name in list(_attached):
+        if name not in (jobs_name, results_name):
+            # replaced by a larger block
+            _attached.pop(name).close()
+    jobs = _attach(jobs_name).buf
+    results = _attach(results_name).buf
+    trees = {}  # offset -> decoded tree of this range
+    for i in range(start, stop):
+        offset, length, seed, width, height = _JOB.unpack_from(jobs, i * _JOB.size)
+        root = trees.get(offset)
+        if root is None:
+            root = encoding.loads(bytes(jobs[offset:offset + length]))
+            trees[offset] = root
+        result = Individual(root).run_game(seed, width=width, height=height)
+        _RESULT.pack_into(results, i * _RESULT.size, result["score"], result["turns"])
+
+
+def pack_request(trees: Sequence[bytes], episodes: Sequence[Sequence[Episode]]) -> bytes:
+    parts = []
+    for codes, tree_episodes in zip(trees, episodes):
+        parts.append(_TREE.pack(len(codes), len(tree_episodes)))
+        parts.append(codes)
+        for episode in tree_episodes:
+            parts.append(_EPISODE.pack(*episode))
+    return b"".join(parts)
+
+
+def unpack_request(data: bytes) -> Tuple[List[bytes], List[List[Episode]]]:
+    trees = []
+    episodes = []
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < _TREE.size:
+            raise ValueError("Truncated request")
+        size, count = _TREE.unpack_from(data, offset)
+        offset += _TREE.size
+        codes = data[offset:offset + size]
+        if len(codes) != size or len(data) - offset - size < count * _EPISODE.size:
+            raise ValueError("Truncated request")
+        offset += size
+        tree_episodes = []
+        for _ in range(count):
+            tree_episodes.append(Episode(*_EPISODE.unpack_from(data, offset)))
+            offset += _EPISODE.size
+        trees.append(codes)
+        episodes.append(tree_episodes)
+    return trees, episodes
+
+
+def pack_response(results: Sequence[Tuple[int, int]]) -> bytes:
+    return b"".join(_RESPONSE.pack(score, turns) for score, turns in results)
+
+
+def unpack_response(data: bytes) -> List[Tuple[int, int]]:
+    if len(data) % _RESPONSE.size:
+        raise ValueError("Truncated response")
+    return list(_RESPONSE.iter_unpack(data))
+
+
+class RemoteEvaluator:
+    """
+    Fan individuals out to evaluation servers, one batch per endpoint.
+    Failed batches are retried and then evaluated by the fallback evaluator.
+    Connections are kept open between batches.
+    """
+    RETRIES = 2
+    TIMEOUT = 60.0
+
+    def __init__(self, endpoints: Sequence[str], fallback=None, retries: int = RETRIES,
+                 timeout: float = TIMEOUT):
+        """
+        :param endpoints: "host:port" of running evaluation servers
+        """
+        self.endpoints = list(endpoints)
+        self.fallback = LocalEvaluator() if fallback is None else fallback
+        self.retries = retries
+        self.timeout = timeout
+        self._connections = {}  # endpoint -> http.client.HTTPConnection
+
+    def evaluate(self, individuals: Sequence[Individual], episodes: Sequence[Sequence[Episode]]):
+        if not self.endpoints:
+            self.fallback.evaluate(individuals, episodes)
+            return
+        episodes = [seeded(e) for e in episodes]
+        n = len(self.endpoints)
+        batches = [(endpoint, individuals[i::n], episodes[i::n])
+                   for i, endpoint in enumerate(self.endpoints)]
+        failed = []
+        threads = [threading.Thread(target=self._evaluate_batch, args=batch + (failed,))
+                   for batch in batches]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for batch_individuals, batch_episodes in failed:
+            self.fallback.evaluate(batch_individuals, batch_episodes)
+
+    def _evaluate_batch(self, endpoint, individuals, episodes, failed):
+        if not individuals:
+            return
+        try:
+            evaluated = self._try_batch(endpoint, individuals, episodes)
+        except Exception:
+            # unexpected failure of this thread, the batch must not stay unevaluated
+            self._close(endpoint)
+            evaluated = False
+        if not evaluated:
+            failed.append((individuals, episodes))
+
+    def _try_batch(self, endpoint, individuals, episodes) -> bool:
+        """
+        :return: whether results were stored, False after all retries failed
+        """
+        body = pack_request([encoding.dumps(ind.root) for ind in individuals], episodes)
+        for _ in range(self.retries + 1):
+            try:
+                results = self._post(endpoint, body)
+            except (OSError, http.client.HTTPException, ValueError):
+                self._close(endpoint)
+                continue
+            if len(results) == sum(len(e) for e in episodes):
+                results = iter(results)
+                for ind, ind_episodes in zip(individuals, episodes):
+                    ind.set_results([EpisodeResult(*episode, *next(results)) for episode in ind_episodes])
+                return True
+        return False
+
+    def _post(self, endpoint, body) -> List[Tuple[int, int]]:
+        connection = self._connections.get(endpoint)
+        if connection is None:
+            connection = http.client.HTTPConnection(endpoint, timeout=self.timeout)
+            self._connections[endpoint] = connection
+        connection.request("POST", PATH, body, {"Content-Type": CONTENT_TYPE})
+        response = connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise ValueError(f"{endpoint}: {response.status} {response.reason}")
+        return unpack_response(data)
+
+    def _close(self, endpoint):
+        connection = self._connections.pop(endpoint, None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        for endpoint in list(self._connections):
+            self._close(endpoint)
+
+
+class SharedMemoryEvaluator:
+    """
+    Evaluate on a local process pool without pickling trees or results.
+    Encoded trees and episodes of a batch are written to one shared memory
+    block, workers write scores and turns into another one; only block names
+    and ranges of episode indices are sent to the workers. Blocks are reused
+    between batches and grow when needed.
+    """
+    MIN_BLOCK = 1 << 16
+
+    def __init__(self, processes: int = None):
+        self.processes = processes or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.processes)
+        self._jobs = None  # type: Optional[SharedMemory]
+        self._results = None  # type: Optional[SharedMemory]
+        self._lock = threading.Lock()
+
+    def evaluate(self, individuals: Sequence[Individual], episodes: Sequence[Sequence[Episode]]):
+        episodes = [seeded(e) for e in episodes]
+        # trees are hash-consed, equal trees are encoded once
+        codes = {}
+        for ind in individuals:
+            if ind.root not in codes:
+                codes[ind.root] = encoding.dumps(ind.root)
+        results = iter(self.evaluate_codes([codes[ind.root] for ind in individuals], episodes))
+        for ind, ind_episodes in zip(individuals, episodes):
+            ind.set_results([EpisodeResult(*episode, *next(results)) for episode in ind_episodes])
+
+    def evaluate_codes(self, trees: Sequence[bytes], episodes: Sequence[Sequence[Episode]]) -> List[Tuple[int, int]]:
+        """
+        Episodes must be seeded (see tree.seeded).
+        :return: score and turns of every episode, in order
+        """
+        count = sum(len(e) for e in episodes)
+        if not count:
+            return []
+        offsets = {}  # codes -> offset in jobs block
+        position = count * _JOB.size
+        for codes in trees:
+            if codes not in offsets:
+                offsets[codes] = position
+                position += len(codes)
+        with self._lock:
+            self._jobs = self._reserve(self._jobs, position)
+            self._results = self._reserve(self._results, count * _RESULT.size)
+            jobs = self._jobs.buf
+            for codes, offset in offsets.items():
+                jobs[offset:offset + len(codes)] = codes
+            i = 0
+            for codes, tree_episodes in zip(trees, episodes):
+                for episode in tree_episodes:
+                    _JOB.pack_into(jobs, i * _JOB.size, offsets[codes], len(codes), *episode)
+                    i += 1
+            del jobs
+            chunk = max(1, math.ceil(count / (4 * self.processes)))
+            futures = [self.pool.submit(evaluate_shared, self._jobs.name, self._results.name,
+                                        start, min(count, start + chunk))
+                       for start in range(0, count, chunk)]
+            for future in futures:
+                future.result()
+            return list(_RESULT.iter_unpack(bytes(self._results.buf[:count * _RESULT.size])))
+
+    def _reserve(self, block: Optional[SharedMemory], size: int) -> SharedMemory:
+        if block is not None:
+            if block.size >= size:
+                return block
+            size = max(size, 2 * block.size)
+            block.close()
+            block.unlink()
+        return SharedMemory(create=True, size=max(size, self.MIN_BLOCK))
+
+    def close(self):
+        self.pool.shutdown()
+        for block in (self._jobs, self._results):
+            if block is not None:
+                block.close()
+                block.unlink()
+        self._jobs = self._results = None
+
+
+def _play(individuals: Sequence[Individual], episodes: Sequence[Sequence[Episode]],
+          behaviour=False) -> List[Tuple[List[EpisodeResult], Optional[novelty.Descriptor]]]:
+    """
+    Play games of individuals without changing them, run by pool threads.
+    :return: results and behaviour descriptor (None unless recorded) of each individual
+    """
+    results = []
+    for ind, ind_episodes in zip(individuals, episodes):
+        ind_results = []
+        recorded = novelty.Behaviour() if behaviour else None
+        for episode in ind_episodes:
+            result = ind.run_game(episode.seed, width=episode.width, height=episode.height, behaviour=recorded)
+            ind_results.append(EpisodeResult(*episode, result["score"], result["turns"]))
+        results.append((ind_results, None if recorded is None else recorded.descriptor()))
+    return results
+
+
+class ThreadPoolEvaluator:
+    """
+    Evaluate on a pool of threads of this process: trees are shared, nothing
+    is copied or pickled. Games run in parallel only on free-threaded CPython
+    (3.13t and newer), under the GIL the pool is about as fast as LocalEvaluator.
+
+    Games are safe to play concurrently: trees are immutable, every game places
+    apples with its own random.Random (episodes without a seed get one drawn
+    here, in the calling thread) and no Evolution parameters are read. Results
+    are stored by the calling thread; breeding stays there too, since operators
+    use the global random.
+    """
+
+    def __init__(self, threads: int = None, behaviour=False):
+        """
+        :param behaviour: record behaviour descriptors during evaluation (NOVELTY selection)
+        """
+        self.threads = threads or os.cpu_count() or 1
+        self.behaviour = behaviour
+        self._pool = None  # type: Optional[ThreadPoolExecutor]
+
+    def evaluate(self, individuals: Sequence[Individual], episodes: Sequence[Sequence[Episode]]):
+        episodes = [seeded(e) for e in episodes]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="evaluation")
+        chunk = max(1, math.ceil(len(individuals) / (4 * self.threads)))
+        futures = [self._pool.submit(_play, individuals[start:start + chunk], episodes[start:start + chunk],
+                                     self.behaviour)
+                   for start in range(0, len(individuals), chunk)]
+        results = [r for future in futures for r in future.result()]
+        for ind, (ind_results, behaviour) in zip(individuals, results):
+            ind.set_results(ind_results, behaviour)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def _gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Scaling of thread pool evaluation.")
+    arg_parser.add_argument("--file", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           "good.individual"),
+                            help="saved individual playing all games")
+    arg_parser.add_argument("--threads", nargs="*", type=int, default=[1, 2, 4, 8])
+    arg_parser.add_argument("--games", type=int, default=200)
+    arg_parser.add_argument("--repeats", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    root = next(encoding.iter_load_file(args.file)).root
+    individuals = [Individual(root) for _ in range(args.games)]
+    episodes = [[Episode(seed, Evolution.EVAL_BOARDS[0][0], Evolution.EVAL_BOARDS[0][1])]
+                for seed in range(args.games)]
+
+    def measure(evaluator) -> Tuple[float, list]:
+        best = math.inf
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            evaluator.evaluate(individuals, episodes)
+            best = min(best, time.perf_counter() - start)
+        return best, [ind.episodes for ind in individuals]
+
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if _gil_enabled() else 'disabled'}, "
+          f"{os.cpu_count()} CPUs, {args.games} games of {args.file}")
+    serial, expected = measure(LocalEvaluator())
+    print(f"serial     {serial:7.3f} s")
+    for threads in args.threads:
+        evaluator = ThreadPoolEvaluator(threads)
+        elapsed, results = measure(evaluator)
+        evaluator.close()
+        if results != expected:
+            raise RuntimeError(f"{threads} threads: results differ from serial evaluation")
+        print(f"{threads:3d} threads {elapsed:7.3f} s, speedup {serial / elapsed:5.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,73 @@
 import tkinter as tk
 from tkinter import ttk
 import threading
+import math
 from functools import partial
 from .tree import *
 from . import parser
+from .chart import Curve, lttb
+from .archive import Archive
+from .worker import EvolutionProcess
+from . import worker
 # from tree import Evolution, Individual, Game, Entity, Population
 
 
-class EvolutionWorker(threading.Thread):
-    def __init__(self, app):
-        super().__init__(daemon=True)
+class EvolutionWorker:
+    """
+    Runs evolution in a child process and polls its progress from the Tk loop.
+    """
+    ARCHIVE_FILE = "archive.sqlite"
+    POLL_DELAY = 100
+
+    def __init__(self, app, archive: Archive = None):
         self.app = app
-        self.evolution = Evolution()
+        self.archive = archive
+        self.process = EvolutionProcess(archive.filename if archive is not None else None)
 
-    def stop(self):
-        self.evolution.finished = True
+    def start(self):
+        self.process.start()
+        self.app.after(self.POLL_DELAY, self._poll)
 
-    def add_population(self, population, generation):
+    def stop(self):
+        self.process.stop()
+
+    def cancel(self):
+        self.process.cancel()
+
+    def _poll(self):
+        alive = self.process.is_alive()
+        # after exit, this drains messages sent right before it
+        self._handle(self.process.poll())
+        self.app.chart.redraw()
+        if alive:
+            self.app.after(self.POLL_DELAY, self._poll)
+        else:
+            self.app.running = False
+
+    def _handle(self, messages):
+        for kind, value in messages:
+            if kind == worker.SUMMARY:
+                self.add_summary(value)
+            elif kind == worker.RUN:
+                self.archive.run = value
+            elif kind == worker.FINISHED:
+                self.log_time(value)
+
+    def add_summary(self, summary: worker.Summary):
+        generation = summary.generation
+        self.app.chart.add(summary)
         if generation % Evolution.PRINT_RATE == 0:
-            self.app.table.add_population(population, generation)
-        self._show_progress(100.0*generation/self.evolution.GENERATIONS)
-        print(f"{generation};{population.get_avg_fitness()};{population.get_avg_score()};"
-              f"{population.get_best().fitness};{population.get_best().score}")
+            if self.archive is None:
+                self.app.table.add_best(summary.best(), generation, str(summary), summary.top_population)
+            else:
+                self.app.table.add_archived(self.archive, generation, str(summary))
+        self._show_progress(100.0*generation/self.process.config["GENERATIONS"])
+        print(f"{generation};{summary.avg_fitness};{summary.avg_score};"
+              f"{summary.best_fitness};{summary.best_score}")
 
     def log_time(self, d_time):
         pass
 
-    def run(self):
-        self.evolution.run(self)
-        # finished
-        self.app.running = False
-
     def _show_progress(self, value):
         self.app.progress_bar["value"] = value
 
@@ -71,9 +108,9 @@ class PopWindow(tk.Toplevel):
             b = tk.Button(
                 self.frame,
                 text="strategy",
-                command=partial(Table.show_popup,
+                command=partial(Table.show_strategy,
                                 "Strategy",
-                                individual.root.tree_string()),
+                                individual),
                 padx=5,
             )
             b.grid(
@@ -264,6 +301,265 @@ class GameWorker(threading.Thread):
         GameWorker.DELAY = float(value)
 
 
+class GalleryWindow(tk.Toplevel):
+    """
+    Many games played at once in one window. One worker thread moves all
+    snakes, boards are drawn into a single image on one shared timer.
+    Boards are painted one pixel per tile into a buffer (only those that
+    changed since the previous frame), the buffer is then scaled into the
+    displayed image by Tk in one call.
+    """
+    FRAME_DELAY = 33
+    SIZE = worker.Summary.TOP  # games shown from a population
+    MAX_WIDTH = 1200
+    MAX_HEIGHT = 800
+    GAP = 1  # pixels between boards, in tiles
+    COLORS = {
+        Entity.EMPTY: "#000000",
+        Entity.WALL: "#696969",  # dim gray
+        Entity.FOOD: "#cd2626",  # firebrick3
+        Entity.SNAKE: "#006400",  # dark green
+    }
+    HEAD_COLOR = "#adff2f"  # green yellow
+    FINISHED_WALL_COLOR = "#2f2f2f"
+
+    def __init__(self, generation: int, individuals: List[Individual], w, h):
+        super().__init__()
+        self.wm_title("Generation {} - {} games".format(generation, len(individuals)))
+        self.individuals = individuals
+        self.w = w
+        self.h = h
+        self.columns = max(1, min(len(individuals), round(math.sqrt(len(individuals) * h / w))))
+        rows = math.ceil(len(individuals) / self.columns)
+        buffer_w = self.columns * (w + self.GAP) - self.GAP
+        buffer_h = rows * (h + self.GAP) - self.GAP
+        self.zoom = max(1, min(self.MAX_WIDTH // buffer_w, self.MAX_HEIGHT // buffer_h))
+
+        self.score_label = ttk.Label(self)
+        self.score_label.pack(side="top", fill=tk.X, padx=10)
+
+        self.buffer = tk.PhotoImage(width=buffer_w, height=buffer_h)
+        self.image = tk.PhotoImage(width=buffer_w * self.zoom, height=buffer_h * self.zoom)
+        self.image_label = tk.Label(self, image=self.image, background="#000", borderwidth=0)
+        self.image_label.pack()
+        self.image_label.bind("<Motion>", self._show_info)
+        self.image_label.bind("<Button-1>", self._run_game)
+
+        self.info_label = tk.Label(self, text="click a board to watch it alone")
+        self.info_label.pack(padx=10)
+
+        self.quit_btn = ttk.Button(self, text="Quit", command=self.stop)
+        self.quit_btn.pack(pady=5)
+        self.protocol("WM_DELETE_WINDOW", self.stop)
+
+        self.worker = GalleryWorker(individuals, w, h)
+        self._drawn = [-1] * len(individuals)  # turn shown for every board
+        self.generation = generation
+        self.worker.start()
+        self._render()
+
+    def stop(self):
+        if self.worker.running:
+            self.worker.stop()
+            self.after(50, self.stop)
+        else:
+            self.destroy()
+
+    def _render(self):
+        changed = False
+        for i, game in enumerate(self.worker.games):
+            turn = self.worker.turns[i]
+            finished = not self.worker.playing[i]
+            # finished boards are drawn once more to show they ended
+            version = turn if not finished else -2 - turn
+            if version == self._drawn[i]:
+                continue
+            self._drawn[i] = version
+            changed = True
+            column = i % self.columns
+            row = i // self.columns
+            self.buffer.put(self._board_data(game, finished),
+                            to=(column * (self.w + self.GAP), row * (self.h + self.GAP)))
+        if changed:
+            self.image.tk.call(self.image, "copy", self.buffer, "-zoom", self.zoom, self.zoom)
+            self._show_score()
+        self.after(self.FRAME_DELAY, self._render)
+
+    def _board_data(self, game: Game, finished: bool) -> str:
+        colors = self.COLORS
+        if finished:
+            colors = dict(colors)
+            colors[Entity.WALL] = self.FINISHED_WALL_COLOR
+        rows = [[colors[entity] for entity in row] for row in game.grid]
+        if 0 <= game.head.y < game.height and 0 <= game.head.x < game.width:
+            rows[game.head.y][game.head.x] = self.HEAD_COLOR
+        return " ".join("{" + " ".join(row) + "}" for row in rows)
+
+    def _show_score(self):
+        scores = [game.score for game in self.worker.games]
+        self.score_label["text"] = "Playing: {:3d}/{}, best score: {:2d}, mean score: {:5.2f}".format(
+            sum(self.worker.playing), len(scores), max(scores), sum(scores) / len(scores))
+
+    def _board_at(self, event):
+        column = event.x // (self.zoom * (self.w + self.GAP))
+        row = event.y // (self.zoom * (self.h + self.GAP))
+        i = row * self.columns + column
+        if column < self.columns and 0 <= i < len(self.individuals):
+            return i
+        return None
+
+    def _show_info(self, event):
+        i = self._board_at(event)
+        if i is not None:
+            self.info_label["text"] = "#{}: fitness {:6.3f}, score {:2d}, turn {:3d}".format(
+                i + 1, self.individuals[i].fitness, self.worker.games[i].score, self.worker.turns[i])
+
+    def _run_game(self, event):
+        i = self._board_at(event)
+        if i is not None:
+            GameWindow.run_game(self.generation, self.individuals[i], self.w, self.h)
+
+    @staticmethod
+    def show(generation: int, pop: Population, count: int, w=Game.WIDTH, h=Game.HEIGHT):
+        """
+        Play the best count individuals of the population.
+        """
+        best = sorted(pop.pop, key=lambda ind: ind.fitness, reverse=True)[:count]
+        if best:
+            GalleryWindow(generation, best, w, h)
+
+
+class GalleryWorker(threading.Thread):
+    """
+    Moves all gallery snakes each GameWorker.DELAY seconds. Games end as in
+    evaluation, including the turn limits, so looping snakes stop too.
+    """
+    _SLEEP = 0.01
+
+    def __init__(self, individuals: List[Individual], w, h):
+        super().__init__(daemon=True)
+        self.individuals = individuals
+        self.games = [Game(h, w) for _ in individuals]
+        self.turns = [0] * len(individuals)
+        self.playing = [True] * len(individuals)
+        self.running = True
+        self.do_stop = False
+
+    def stop(self):
+        self.do_stop = True
+
+    def _playing(self, game: Game, turn: int) -> bool:
+        if not game.running or turn >= Individual.MAX_TURNS:
+            return False
+        if game.score == 0 and turn > Individual.MAX_TURNS_ZERO:
+            return False
+        return not (game.score < Individual.LOW_SCORE and turn > Individual.MAX_TURNS_LOW)
+
+    def run(self):
+        start_time = time.perf_counter()
+        while any(self.playing) and not self.do_stop:
+            cur_time = time.perf_counter()
+            if cur_time - start_time > GameWorker.DELAY:
+                for i, (individual, game) in enumerate(zip(self.individuals, self.games)):
+                    if not self.playing[i]:
+                        continue
+                    game.move(individual.get_direction(game))
+                    self.turns[i] += 1
+                    self.playing[i] = self._playing(game, self.turns[i])
+                start_time = cur_time
+            else:
+                time.sleep(self._SLEEP)
+
+        self.running = False
+
+
+class FitnessChart(tk.Canvas):
+    """
+    Live curves of average and best fitness (top) and score (bottom) per
+    generation. Curves are downsampled (see chart module) and drawn by moving
+    the points of existing canvas items, so a redraw costs the same however
+    long the run is.
+    """
+    WIDTH = 350
+    HEIGHT = 300
+    MARGIN = 40
+    POINTS = 300  # per curve
+    AVG_COLOR = "#1e90ff"  # dodger blue
+    BEST_COLOR = "#cd2626"  # firebrick3
+    PANELS = ("fitness", "score")
+
+    def __init__(self, master):
+        super().__init__(master, width=self.WIDTH, height=self.HEIGHT, background="#ffffff")
+        self.curves = {}
+        self.lines = {}
+        self.max_labels = {}
+        self._panels = {}  # top and bottom of plot area
+        self.generation_label = self.create_text(self.WIDTH - 5, self.HEIGHT - 5, anchor=tk.SE)
+        height = (self.HEIGHT - self.MARGIN) / len(self.PANELS)
+        for i, panel in enumerate(self.PANELS):
+            top = 5 + i * height
+            bottom = top + height - self.MARGIN / 2
+            self._panels[panel] = (top, bottom)
+            self.create_rectangle(self.MARGIN, top, self.WIDTH - 5, bottom, outline="#a9a9a9")
+            self.create_text(self.MARGIN - 3, bottom, text="0", anchor=tk.E)
+            self.max_labels[panel] = self.create_text(self.MARGIN - 3, top, anchor=tk.NE)
+            self.create_text(self.MARGIN + 5, top + 2, anchor=tk.NW, text=panel)
+            self.create_text(self.WIDTH - 10, top + 2, anchor=tk.NE, text="best", fill=self.BEST_COLOR)
+            self.create_text(self.WIDTH - 45, top + 2, anchor=tk.NE, text="avg", fill=self.AVG_COLOR)
+            for kind, color in (("avg", self.AVG_COLOR), ("best", self.BEST_COLOR)):
+                self.curves[panel, kind] = Curve(self.POINTS)
+                self.lines[panel, kind] = self.create_line(0, 0, 0, 0, fill=color, state=tk.HIDDEN)
+        self.reset()
+
+    def reset(self):
+        for curve in self.curves.values():
+            curve.clear()
+        for line in self.lines.values():
+            self.itemconfigure(line, state=tk.HIDDEN)
+        self._max = {panel: 0.0 for panel in self.PANELS}
+        self._generation = 0
+        self._changed = False
+        self.itemconfigure(self.generation_label, text="")
+        for label in self.max_labels.values():
+            self.itemconfigure(label, text="")
+
+    def add(self, summary: worker.Summary):
+        values = {
+            ("fitness", "avg"): summary.avg_fitness, ("fitness", "best"): summary.best_fitness,
+            ("score", "avg"): summary.avg_score, ("score", "best"): summary.best_score,
+        }
+        for (panel, kind), value in values.items():
+            self.curves[panel, kind].add(summary.generation, value)
+            self._max[panel] = max(self._max[panel], value)
+        self._generation = summary.generation
+        self._changed = True
+
+    def redraw(self):
+        """
+        Show curves added since the last redraw, call once per batch of generations.
+        """
+        if not self._changed:
+            return
+        self._changed = False
+        left, right = self.MARGIN, self.WIDTH - 5
+        x_scale = (right - left) / max(1, self._generation)
+        for (panel, kind), curve in self.curves.items():
+            top, bottom = self._panels[panel]
+            y_scale = (bottom - top) / (self._max[panel] or 1.0)
+            coords = []
+            # recent generations are not downsampled yet, even them out
+            for x, y in lttb(curve.points, self.POINTS):
+                coords.append(left + x * x_scale)
+                coords.append(bottom - y * y_scale)
+            if len(coords) == 2:
+                coords *= 2
+            self.coords(self.lines[panel, kind], *coords)
+            self.itemconfigure(self.lines[panel, kind], state=tk.NORMAL)
+        for panel, label in self.max_labels.items():
+            self.itemconfigure(label, text="{:.4g}".format(self._max[panel]))
+        self.itemconfigure(self.generation_label, text="generation {}".format(self._generation))
+
+
 class Application(tk.Frame):
     TITLE = "Snake"
     WIDTH = 1400
@@ -272,6 +568,7 @@ class Application(tk.Frame):
     def __init__(self, master=None):
         super().__init__(master)
         self.running = False
+        self.archive = None
 
         self.master.title(self.TITLE)
         self.master.minsize(400, 400)
@@ -279,6 +576,7 @@ class Application(tk.Frame):
         # self.master.resizable(0, 0)
         self.master.geometry(str(self.WIDTH) + "x" + str(self.HEIGHT))
         self.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        self.master.protocol("WM_DELETE_WINDOW", self._quit)
 
         self.top_frame = tk.Frame(self)
         self.top_frame.pack(side=tk.TOP)
@@ -297,6 +595,13 @@ class Application(tk.Frame):
         )
         self.run_btn.pack(padx=10)
 
+        self.archive_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            self.top_frame,
+            text="archive to disk",
+            variable=self.archive_var,
+        ).pack()
+
         self.w_scale = tk.Scale(self.top_frame,
                                 from_=8,
                                 to=100,
@@ -368,18 +673,33 @@ class Application(tk.Frame):
         self.scale.set(Evolution.MUTATION_CHANCE)
         self.scale.pack()
 
+        self.chart = FitnessChart(self.input)
+        self.chart.pack(pady=10)
+
     def _toggle_run(self):
         if self.running:
             self.worker.stop()
         else:
             self.running = True
             self.table.reset()
-            self.worker = EvolutionWorker(self)
+            self.chart.reset()
+            if self.archive_var.get() and self.archive is None:
+                self.archive = Archive(EvolutionWorker.ARCHIVE_FILE)
+            archive = self.archive if self.archive_var.get() else None
+            self.worker = EvolutionWorker(self, archive)
             self.worker.start()
 
+    def _quit(self):
+        if self.running:
+            self.worker.cancel()
+        self.master.destroy()
+
     def run_game(self, generation: int, individual: Individual):
         GameWindow.run_game(generation, individual, int(self.w_scale.get()), int(self.h_scale.get()))
 
+    def run_gallery(self, generation: int, pop: Population):
+        GalleryWindow.show(generation, pop, GalleryWindow.SIZE, int(self.w_scale.get()), int(self.h_scale.get()))
+
     def _load_individual(self):
         ind = parser.load_dialog()
         if ind is not None:
@@ -416,6 +736,23 @@ class Table(tk.Frame):
             l.destroy()
 
     def add_population(self, pop: Population, generation, show_all: bool = False):
+        self._add_row(generation, str(pop), pop.get_best, partial(lambda: pop) if show_all else None)
+
+    def add_best(self, best: Individual, generation, text: str, get_top=None):
+        """
+        :param get_top: function returning population of the best individuals, shown in the gallery
+        """
+        self._add_row(generation, text, partial(lambda: best), get_gallery=get_top)
+
+    def add_archived(self, archive: Archive, generation, text: str):
+        """
+        Add generation stored in archive. Individuals are loaded only on demand.
+        """
+        self._add_row(generation, text,
+                      partial(archive.best, generation),
+                      partial(archive.population, generation))
+
+    def _add_row(self, generation, text: str, get_best, get_population=None, get_gallery=None):
         tk.Label(self.frame,
                  text="{}".format(generation),
                  width=3,
@@ -428,56 +765,88 @@ class Table(tk.Frame):
                         sticky=tk.W,
                         padx=5)
         tk.Label(self.frame,
-                 text=str(pop),
+                 text=text,
                  padx=5,
                  ).grid(row=self.row,
                         column=1,
                         sticky=tk.NSEW,
                         padx=10)
         tk.Button(self.frame, text="strategy",
-                  command=partial(Table.show_popup,
-                                  "Generation {} - Best strategy".format(generation),
-                                  pop.get_best().root.tree_string()),
+                  command=lambda: Table.show_strategy(
+                      "Generation {} - Best strategy".format(generation),
+                      get_best()),
                   padx=5,
                   ).grid(row=self.row,
                          column=2,
                          sticky=tk.E,
                          padx=5)
         tk.Button(self.frame, text="run",
-                  command=partial(self.app.run_game,
-                                  generation,
-                                  pop.get_best()),
+                  command=lambda: self.app.run_game(generation, get_best()),
                   padx=10,
                   ).grid(row=self.row,
                          column=3,
                          sticky=tk.E,
                          padx=5)
-        if show_all:
+        if get_population is not None:
             tk.Button(self.frame, text="show",
-                      command=partial(PopWindow.show,
-                                      generation,
-                                      pop),
+                      command=lambda: PopWindow.show(generation, get_population()),
                       padx=10,
                       ).grid(row=self.row,
                              column=4,
                              sticky=tk.E,
                              padx=5)
+        if get_gallery is None:
+            get_gallery = get_population
+        if get_gallery is not None:
+            tk.Button(self.frame, text="gallery",
+                      command=lambda: self.app.run_gallery(generation, get_gallery()),
+                      padx=10,
+                      ).grid(row=self.row,
+                             column=5,
+                             sticky=tk.E,
+                             padx=5)
 
         tk.Button(self.frame, text="save best",
-                  command=partial(parser.save_dialog,
-                                  pop.get_best()),
+                  command=lambda: parser.save_dialog(get_best()),
                   padx=10,
                   ).grid(row=self.row,
-                         column=5,
+                         column=6,
                          sticky=tk.E)
         self.row += 1
 
+    REPLAY_POLL = 100
+
+    @staticmethod
+    def show_strategy(title, individual: Individual):
+        """
+        Show strategy with node visit counts from replaying the evaluation games
+        (a random game if they are not known). Games are replayed in a thread,
+        the counts are shown when it finishes.
+        """
+        label = Table.show_popup(title, "Replaying evaluation games...")
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(individual.root.tree_string(hits=individual.coverage())),
+            daemon=True)
+        thread.start()
+
+        def show():
+            if not label.winfo_exists():
+                return
+            if thread.is_alive():
+                label.after(Table.REPLAY_POLL, show)
+            else:
+                label["text"] = result[0] if result else "Replay failed"
+
+        label.after(Table.REPLAY_POLL, show)
+
     @staticmethod
-    def show_popup(title, text):
+    def show_popup(title, text) -> tk.Label:
         win = tk.Toplevel()
         win.wm_title(title)
         l = tk.Label(win, text=text, anchor="w", justify=tk.LEFT)
         l.pack(padx=10, pady=10)
+        return l
 
     def on_frame_configure(self, event):
         """
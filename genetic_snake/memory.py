@@ -0,0 +1,122 @@
+"""
+Memory accounting of an evolution run.
+
+Sizes are estimates from sys.getsizeof: trees are hash-consed, so nodes
+shared by several individuals (or several places of one tree) are counted
+once. Counting live games walks all objects tracked by the garbage
+collector and allocation sites need tracemalloc, which slows the run down
+noticeably; both are optional.
+"""
+import gc
+import sys
+import tracemalloc
+from collections import namedtuple
+from typing import Iterable, List, Optional, Tuple
+from .snake import Game
+from .tree import Individual, Node
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# memory of one generation, counts and sizes in bytes:
+#   nodes      - number of tree nodes of all individuals, shared subtrees counted at every position
+#   distinct   - distinct nodes of the population, live - all nodes alive in the process
+#   individual - mean size of an individual without its tree
+#   population - individuals and their distinct nodes
+#   history    - kept across generations (novelty archive)
+#   games      - live Game objects, None if not counted
+#   peak_rss   - peak resident set size of the process, None if unknown
+#   traced     - memory allocated since tracing started, None without tracemalloc
+#   top        - (allocation site, bytes) of largest sites
+Memory = namedtuple("Memory", "generation individuals nodes mean_nodes distinct live max_depth "
+                              "individual population history games peak_rss traced top")
+
+
+def distinct_nodes(roots: Iterable[Node]) -> int:
+    seen = set()
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if node.left is not None:
+            stack.append(node.left)
+            stack.append(node.right)
+    return len(seen)
+
+
+def individual_bytes(ind: Individual) -> int:
+    size = sys.getsizeof(ind) + sys.getsizeof(ind.__dict__) + sys.getsizeof(ind.parents)
+    size += sys.getsizeof(ind.episodes) + sum(sys.getsizeof(r) for r in ind.episodes)
+    if ind._behaviour is not None:
+        size += sys.getsizeof(ind._behaviour)
+    return size
+
+
+def live_games() -> int:
+    return sum(1 for o in gc.get_objects() if type(o) is Game)
+
+
+def peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def top_sites(count: int) -> List[Tuple[str, int]]:
+    if not count or not tracemalloc.is_tracing():
+        return []
+    statistics = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    )).statistics("lineno")
+    return [(str(s.traceback), s.size) for s in statistics[:count]]
+
+
+def measure(individuals: List[Individual], generation: int, history: int = 0,
+            count_games: bool = True, top: int = 0) -> Memory:
+    """
+    :param history: estimated bytes kept across generations
+    :param top: number of largest allocation sites, needs tracemalloc running
+    """
+    sizes = [ind.root.size() for ind in individuals]
+    individual = [individual_bytes(ind) for ind in individuals]
+    distinct = distinct_nodes({id(ind.root): ind.root for ind in individuals}.values())
+    return Memory(
+        generation=generation,
+        individuals=len(individuals),
+        nodes=sum(sizes),
+        mean_nodes=sum(sizes) / len(sizes) if sizes else 0.0,
+        distinct=distinct,
+        live=Node.live_count(),
+        max_depth=max((ind.root.depth() for ind in individuals), default=0),
+        individual=sum(individual) / len(individual) if individual else 0.0,
+        population=sum(individual) + sys.getsizeof(individuals) +
+                   (distinct * sys.getsizeof(individuals[0].root) if individuals else 0),
+        history=history,
+        games=live_games() if count_games else None,
+        peak_rss=peak_rss(),
+        traced=tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        top=top_sites(top),
+    )
+
+
+def estimate(memory: Memory) -> int:
+    """
+    Estimated bytes of population and history, the part pruning can reduce.
+    """
+    return memory.population + memory.history
+
+
+def total(memory: Memory) -> int:
+    """
+    Bytes compared with the warning threshold: traced memory if tracing, estimate otherwise.
+    """
+    if memory.traced is not None:
+        return memory.traced
+    return estimate(memory)
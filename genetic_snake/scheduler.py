@@ -0,0 +1,80 @@
+"""
+Wall-clock budget of an evolution run.
+
+The scheduler measures how long one evaluation takes and uses it to plan
+how many offspring fit into the remaining time and how many individuals
+can be evaluated between two checks of the deadline and the stop request.
+Until the first measurement chunks start small and double, afterwards
+they are sized from the measured cost. Cost grows quickly as snakes get
+better and play longer games, so a higher measured cost is used at once.
+"""
+import time
+
+
+class Scheduler:
+    # weight of the newest measurement in the moving average of evaluation cost
+    SMOOTHING = 0.3
+
+    def __init__(self, budget: float, stop=None, clock=time.monotonic):
+        """
+        :param budget: seconds the run may take
+        :param stop: optional Event, stops the run when set
+        """
+        self.clock = clock
+        self.start = clock()
+        self.deadline = self.start + budget
+        self.stop = stop
+        self.cost = None  # seconds per evaluated individual, None until measured
+        self._chunk = 0  # size of the previous chunk of the current batch
+
+    def elapsed(self) -> float:
+        return self.clock() - self.start
+
+    def remaining(self) -> float:
+        return self.deadline - self.clock()
+
+    def expired(self) -> bool:
+        """
+        Deadline passed or stop requested.
+        """
+        return self.remaining() <= 0 or (self.stop is not None and self.stop.is_set())
+
+    def record(self, evaluations: int, seconds: float):
+        """
+        Update cost estimate with measured evaluation of a batch.
+        """
+        if evaluations <= 0:
+            return
+        cost = seconds / evaluations
+        if self.cost is None or cost > self.cost:
+            self.cost = cost
+        else:
+            self.cost += self.SMOOTHING * (cost - self.cost)
+
+    def plan(self, generations_left: int, wanted: int, minimum: int) -> int:
+        """
+        Number of evaluations for the next generation, so that the remaining
+        generations fit before the deadline. Never below minimum.
+        """
+        if self.cost is None or self.cost <= 0 or generations_left <= 0:
+            return wanted
+        affordable = int(self.remaining() / generations_left / self.cost)
+        return max(minimum, min(wanted, affordable))
+
+    def start_batch(self):
+        self._chunk = 0
+
+    def chunk_size(self, interval: float, count: int) -> int:
+        """
+        Number of evaluations taking about interval seconds (less near the
+        deadline), at most count. Before the cost is measured, chunks start at
+        one and double. Non-positive interval evaluates everything at once.
+        """
+        if interval <= 0:
+            return count
+        if self.cost is not None and self.cost > 0:
+            size = int(min(interval, self.remaining()) / self.cost)
+        else:
+            size = max(1, 2 * self._chunk)
+        self._chunk = max(1, min(count, size))
+        return self._chunk
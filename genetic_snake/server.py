@@ -0,0 +1,87 @@
+"""
+HTTP evaluation server sharing fitness work between machines.
+
+Run with:
+    python -m genetic_snake.server --port 8765 --processes 4
+and pass "host:8765" to evaluation.RemoteEvaluator.
+"""
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .evaluation import (PATH, CONTENT_TYPE, SharedMemoryEvaluator, pack_response,
+                         unpack_request)
+
+
+class EvaluationHandler(BaseHTTPRequestHandler):
+    # keep client connections open between batches
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if self.path != PATH:
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            trees, episodes = unpack_request(self.rfile.read(length))
+            results = self.server.evaluate(trees, episodes)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        body = pack_response(results)
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class EvaluationServer(ThreadingHTTPServer):
+    """
+    Evaluates batches of trees on a process pool shared by all connections
+    (see SharedMemoryEvaluator), one batch at a time. Games of one tree run
+    in parallel.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 8765), processes: int = None, verbose: bool = False):
+        super().__init__(address, EvaluationHandler)
+        self.evaluator = SharedMemoryEvaluator(processes)
+        self.processes = self.evaluator.processes
+        self.verbose = verbose
+
+    def evaluate(self, trees, episodes):
+        """
+        :return: score and turns of every episode, in request order
+        """
+        return self.evaluator.evaluate_codes(trees, episodes)
+
+    def server_close(self):
+        super().server_close()
+        self.evaluator.close()
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--processes", type=int, default=None)
+    arg_parser.add_argument("--verbose", action="store_true")
+    args = arg_parser.parse_args()
+    with EvaluationServer((args.host, args.port), args.processes, args.verbose) as server:
+        print(f"Evaluating on {server.endpoint} with {server.processes} processes")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
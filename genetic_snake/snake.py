@@ -1,4 +1,5 @@
-from random import randrange, choice
+import random
+from random import choice
 from collections import namedtuple
 
 Point = namedtuple("Point", "x y")
@@ -91,9 +92,13 @@ class Game:
         Entity.FOOD: "F",
     }
 
-    def __init__(self, height=HEIGHT, width=WIDTH):
+    def __init__(self, height=HEIGHT, width=WIDTH, rng=None):
+        """
+        :param rng: random.Random used for apple placement, global random if None
+        """
         self.height = height
         self.width = width
+        self.rng = random if rng is None else rng
         self.grid = []
         # default 2D array
         self.dir_map = [[Direction(Direction.RIGHT) for _ in range(width)] for _ in range(height)]
@@ -142,7 +147,7 @@ class Game:
         # RIGHT
         found = False
         x = head_x + 1
-        while x < Game.WIDTH:
+        while x < self.width:
             if self.grid[head_y][x] != Entity.EMPTY:
                 if not found:
                     self.state[Direction.RIGHT][VISIBLE] = self.grid[head_y][x]
@@ -168,7 +173,7 @@ class Game:
         # DOWN
         y = head_y + 1
         found = False
-        while y < Game.HEIGHT:
+        while y < self.height:
             if self.grid[y][head_x] != Entity.EMPTY:
                 if not found:
                     self.state[Direction.DOWN][VISIBLE] = self.grid[y][head_x]
@@ -230,8 +235,8 @@ class Game:
         i = 0
         # random position
         while i < 20:
-            y = randrange(1, self.height - 1)
-            x = randrange(1, self.width - 1)
+            y = self.rng.randrange(1, self.height - 1)
+            x = self.rng.randrange(1, self.width - 1)
             if self.grid[y][x] == Entity.EMPTY:
                 self.grid[y][x] = Entity.FOOD
                 return
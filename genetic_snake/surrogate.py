@@ -0,0 +1,255 @@
+"""
+Surrogate fitness model used to skip simulating hopeless offspring.
+
+Features of a tree are cheap to compute: size, depth, which sensors are
+tested and the truth table of the tree on a fixed set of probe game states
+(how often the chosen move is fatal or gets closer to the apple, how often
+the root test holds). A ridge regression of log(1 + fitness) on them is
+trained online from evaluated individuals, older generations are gradually
+forgotten.
+"""
+import copy
+import math
+import weakref
+from collections import namedtuple
+from random import Random, random
+from typing import List, Sequence, Tuple
+from .snake import Direction, Entity, Game
+from .tree import Function, Individual, Node, Rotation
+from . import snake
+
+# probe game state, usable in place of Game by Node.evaluate
+Probe = namedtuple("Probe", "state current_direction fatal closer")
+
+SENSORS = {}
+for _func_type in Function.TYPES:
+    for _is_func in Function.NEARBY_FUNCTIONS if _func_type == snake.NEARBY else Function.IS_FUNCTIONS:
+        SENSORS[(_func_type, _is_func)] = len(SENSORS)
+FEATURES = 7 + len(SENSORS)
+
+
+def _food(game: Game):
+    for y, row in enumerate(game.grid):
+        for x, entity in enumerate(row):
+            if entity == Entity.FOOD:
+                return x, y
+    return None
+
+
+def _outcomes(game: Game, food) -> Tuple[Tuple[bool, ...], Tuple[bool, ...]]:
+    """
+    Whether moving with each rotation is fatal and gets closer to food.
+    """
+    fatal = []
+    closer = []
+    for rotation in Rotation.TYPES:
+        point = Direction.TO_POINT[Rotation(rotation).rotate(game.current_direction.type)]
+        x = game.head.x + point.x
+        y = game.head.y + point.y
+        entity = game.grid[y][x]
+        fatal.append(entity in (Entity.WALL, Entity.SNAKE) and (x, y) != (game.tail.x, game.tail.y))
+        closer.append(food is not None and
+                      abs(food[0] - x) + abs(food[1] - y) < abs(food[0] - game.head.x) + abs(food[1] - game.head.y))
+    return tuple(fatal), tuple(closer)
+
+
+def probe_states(count: int = 64, seed: int = 0) -> List[Probe]:
+    """
+    Sample game states from games of a random, mostly food-seeking player.
+    """
+    rng = Random(seed)
+    probes = []
+    while len(probes) < count:
+        game = Game(rng=rng)
+        turn = 0
+        while game.running and len(probes) < count and turn < 300:
+            fatal, closer = _outcomes(game, _food(game))
+            if turn % 3 == 0:
+                probes.append(Probe(copy.deepcopy(game.state), Direction(game.current_direction.type),
+                                    fatal, closer))
+            safe = [r for r in Rotation.TYPES if not fatal[r]]
+            if not safe:
+                break
+            toward = [r for r in safe if closer[r]]
+            rotation = rng.choice(toward if toward and rng.random() < 0.7 else safe)
+            game.move(Direction(Rotation(rotation).rotate(game.current_direction.type)))
+            turn += 1
+    return probes
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> List[float]:
+    """
+    Solve linear system by Gaussian elimination with partial pivoting.
+    """
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        if rows[col][col] == 0:
+            continue
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            if factor:
+                for c in range(col, n + 1):
+                    rows[r][c] -= factor * rows[col][c]
+    solution = [0.0] * n
+    for r in reversed(range(n)):
+        if rows[r][r] != 0:
+            solution[r] = (rows[r][n] - sum(rows[r][c] * solution[c] for c in range(r + 1, n))) / rows[r][r]
+    return solution
+
+
+class Surrogate:
+    """
+    Online linear models predicting, without playing, the fitness of a tree
+    and whether it is hopeless (fitness below threshold). Both are ridge
+    regressions sharing the normal equations.
+    Statistics: `saved` simulations, `explored` hopeless individuals evaluated
+    anyway and how many of them were `missed` (not hopeless after all),
+    mean absolute error of predicted fitness (`mae`).
+    """
+    PROBES = 64
+    FORGET = 0.9  # weight of old samples after each update
+    RIDGE = 1e-2
+
+    def __init__(self, threshold: float = 1.0, confidence: float = 0.8, explore: float = 0.1,
+                 min_samples: int = 200, probes: List[Probe] = None):
+        """
+        :param threshold: individuals with fitness below are hopeless
+        :param confidence: predicted probability of being hopeless needed to skip evaluation
+        :param explore: probability of evaluating predicted hopeless individual anyway
+        :param min_samples: nothing is skipped before the model saw that many individuals
+        """
+        self.threshold = threshold
+        self.confidence = confidence
+        self.explore = explore
+        self.min_samples = min_samples
+        self.probes = probe_states(self.PROBES) if probes is None else probes
+        self._xtx = [[0.0] * FEATURES for _ in range(FEATURES)]
+        self._xty_fitness = [0.0] * FEATURES  # target log(1 + fitness)
+        self._xty_hopeless = [0.0] * FEATURES  # target 1 if hopeless else 0
+        self.fitness_weights = [0.0] * FEATURES
+        self.hopeless_weights = [0.0] * FEATURES
+        self.samples = 0
+        self._features = weakref.WeakKeyDictionary()  # root -> features, trees are immutable
+        self._predictions = {}  # uid -> (fitness, hopeless) predicted for screened individuals
+        self.screened = 0
+        self.saved = 0
+        self.explored = 0
+        self.missed = 0
+        self._errors = 0
+        self._error_sum = 0.0
+
+    def features(self, root: Node) -> List[float]:
+        cached = self._features.get(root)
+        if cached is not None:
+            return cached
+        sensors = [0.0] * len(SENSORS)
+        for node in root.flatten([]):
+            if not node.data.is_terminal():
+                sensors[SENSORS[(node.data.func_type, node.data.is_func)]] = 1.0
+        fatal = closer = root_true = 0
+        actions = set()
+        for probe in self.probes:
+            action = root.evaluate(probe).type
+            actions.add(action)
+            fatal += probe.fatal[action]
+            closer += probe.closer[action]
+            if not root.data.is_terminal():
+                root_true += bool(root.data.evaluate(probe))
+        n = len(self.probes)
+        features = [1.0, math.log1p(root.size()), root.depth() / 10,
+                    fatal / n, closer / n, root_true / n, len(actions) / 3] + sensors
+        self._features[root] = features
+        return features
+
+    @staticmethod
+    def _dot(weights, features) -> float:
+        return sum(w * x for w, x in zip(weights, features))
+
+    def predict(self, root: Node) -> float:
+        """
+        Predicted fitness.
+        """
+        return max(0.0, math.expm1(self._dot(self.fitness_weights, self.features(root))))
+
+    def hopeless(self, root: Node) -> float:
+        """
+        Predicted probability of fitness below threshold.
+        """
+        return min(1.0, max(0.0, self._dot(self.hopeless_weights, self.features(root))))
+
+    def ready(self) -> bool:
+        return self.samples >= self.min_samples
+
+    def screen(self, individuals: Sequence[Individual]) -> Tuple[List[Individual], List[Individual]]:
+        """
+        Split individuals to those worth evaluating and hopeless ones.
+        Hopeless ones are kept for evaluation with probability `explore`.
+        """
+        accepted = []
+        rejected = []
+        for ind in individuals:
+            if not self.ready():
+                accepted.append(ind)
+                continue
+            self.screened += 1
+            hopeless = self.hopeless(ind.root) >= self.confidence
+            self._predictions[ind.uid] = (self.predict(ind.root), hopeless)
+            if not hopeless:
+                accepted.append(ind)
+            elif random() < self.explore:
+                self.explored += 1
+                accepted.append(ind)
+            else:
+                rejected.append(ind)
+        return accepted, rejected
+
+    def update(self, individuals: Sequence[Individual]):
+        """
+        Train on evaluated individuals, update error statistics of earlier predictions.
+        """
+        for row in self._xtx:
+            for c in range(len(row)):
+                row[c] *= self.FORGET
+        self._xty_fitness = [v * self.FORGET for v in self._xty_fitness]
+        self._xty_hopeless = [v * self.FORGET for v in self._xty_hopeless]
+        for ind in individuals:
+            prediction = self._predictions.pop(ind.uid, None)
+            if prediction is not None:
+                predicted, hopeless = prediction
+                self._errors += 1
+                self._error_sum += abs(predicted - ind.fitness)
+                if hopeless and ind.fitness >= self.threshold:
+                    self.missed += 1
+            x = self.features(ind.root)
+            y_fitness = math.log1p(max(0.0, ind.fitness))
+            y_hopeless = 1.0 if ind.fitness < self.threshold else 0.0
+            for i, xi in enumerate(x):
+                row = self._xtx[i]
+                for j, xj in enumerate(x):
+                    row[j] += xi * xj
+                self._xty_fitness[i] += xi * y_fitness
+                self._xty_hopeless[i] += xi * y_hopeless
+            self.samples += 1
+        # unevaluated (rejected) individuals never get a result
+        self._predictions.clear()
+        regularized = [[v + (self.RIDGE if i == j else 0.0) for j, v in enumerate(row)]
+                       for i, row in enumerate(self._xtx)]
+        self.fitness_weights = _solve(regularized, self._xty_fitness)
+        self.hopeless_weights = _solve(regularized, self._xty_hopeless)
+
+    def fit_archive(self, archive):
+        """
+        Train on every individual evaluated in the archive's run.
+        """
+        for generation, *_ in archive.best_per_generation():
+            self.update(archive.evaluated(generation))
+
+    def mae(self) -> float:
+        return self._error_sum / self._errors if self._errors else math.nan
+
+    def __str__(self):
+        return (f"Surrogate: {self.saved} of {self.screened} simulations saved, "
+                f"MAE {self.mae():.3f}, {self.missed} of {self.explored} explored hopeless were not")
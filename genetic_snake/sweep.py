@@ -0,0 +1,194 @@
+"""
+Hyperparameter sweep over Evolution parameters.
+
+Every config is run several times with different seeds on one shared process
+pool. Per-generation curves are aggregated across repeats (mean and 95 %
+confidence interval) into one summary file.
+
+Example:
+    python -m genetic_snake.sweep --grid RESTRICT_DEPTH=4,5,6 CROSSOVER_RATE=0.05,0.1 \\
+        --set GENERATIONS=40 --repeats 5 --out sweep.txt
+"""
+import argparse
+import itertools
+import math
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+from .tree import Evolution, LogHandler
+
+METRICS = ("avg_fitness", "avg_score", "best_fitness", "best_score")
+# two-sided 95 % Student t quantiles by degrees of freedom, normal above
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365,
+        8: 2.306, 9: 2.262, 10: 2.228, 15: 2.131, 20: 2.086, 30: 2.042, 40: 2.021,
+        60: 2.000, 120: 1.980}
+
+
+def grid(**values: Sequence) -> List[dict]:
+    """
+    All combinations of given parameter values.
+    """
+    names = sorted(values)
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*(values[name] for name in names))]
+
+
+def random_search(n: int, rng: random.Random = None, **ranges) -> List[dict]:
+    """
+    n random configs. Range is (low, high) for uniform float/int or a list to choose from.
+    """
+    rng = random.Random() if rng is None else rng
+    configs = []
+    for _ in range(n):
+        config = {}
+        for name in sorted(ranges):
+            values = ranges[name]
+            if isinstance(values, list):
+                config[name] = rng.choice(values)
+            elif isinstance(values[0], int) and isinstance(values[1], int):
+                config[name] = rng.randint(*values)
+            else:
+                config[name] = rng.uniform(*values)
+        configs.append(config)
+    return configs
+
+
+class CurveHandler(LogHandler):
+    """
+    Collect per-generation values of METRICS.
+    """
+
+    def __init__(self):
+        self.curve = []  # type: List[Tuple[float, ...]]
+
+    def add_population(self, population, generation):
+        best = population.get_best()
+        self.curve.append((population.get_avg_fitness(), population.get_avg_score(),
+                           best.fitness, best.score))
+
+
+def run_one(config: dict, seed: int) -> List[Tuple[float, ...]]:
+    """
+    Run evolution with given config and seed. Executed in pool process.
+    """
+    random.seed(seed)
+    handler = CurveHandler()
+    Evolution(**config).run(handler)
+    return handler.curve
+
+
+def t_95(n: int) -> float:
+    """
+    Two-sided 95% t quantile for n samples (n > 1). Degrees of freedom between
+    tabulated ones are rounded down, so intervals are never too narrow.
+    """
+    df = n - 1
+    return T_95[max(known for known in T_95 if known <= df)]
+
+
+def aggregate(curves: List[List[Tuple[float, ...]]]) -> List[Dict[str, Tuple[float, float]]]:
+    """
+    Mean and confidence interval half-width of each metric per generation.
+    Runs stopped early (MAX_RUNNING_TIME) only count for generations they reached.
+    """
+    result = []
+    for generation in range(max(len(c) for c in curves)):
+        rows = [c[generation] for c in curves if generation < len(c)]
+        values = {}
+        for i, metric in enumerate(METRICS):
+            column = [row[i] for row in rows]
+            mean = statistics.fmean(column)
+            if len(column) > 1:
+                ci = t_95(len(column)) * statistics.stdev(column) / math.sqrt(len(column))
+            else:
+                ci = math.nan
+            values[metric] = (mean, ci)
+        values["repeats"] = len(rows)
+        result.append(values)
+    return result
+
+
+def config_name(config: dict) -> str:
+    return ",".join(f"{name}={config[name]}" for name in sorted(config))
+
+
+def run_sweep(configs: List[dict], repeats: int = 3, processes: int = None, seed: int = 0,
+              base: dict = None) -> Dict[str, list]:
+    """
+    Run every config `repeats` times. Repeat i uses seed + i for every config.
+    :param base: parameters shared by all configs
+    :return: config name -> aggregated curves
+    """
+    base = {} if base is None else base
+    with ProcessPoolExecutor(processes) as pool:
+        futures = {
+            config_name(config): [pool.submit(run_one, {**base, **config}, seed + i)
+                                  for i in range(repeats)]
+            for config in configs
+        }
+        return {name: aggregate([f.result() for f in repeat_futures])
+                for name, repeat_futures in futures.items()}
+
+
+def write_summary(results: Dict[str, list], filename: str):
+    columns = ["config", "generation", "repeats"]
+    for metric in METRICS:
+        columns += [metric, metric + "_ci"]
+    with open(filename, "w") as handle:
+        handle.write(";".join(columns) + "\n")
+        for name, curve in results.items():
+            for generation, values in enumerate(curve):
+                row = [name, str(generation), str(values["repeats"])]
+                for metric in METRICS:
+                    row += [str(v) for v in values[metric]]
+                handle.write(";".join(row) + "\n")
+
+
+def _parse_value(text: str):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _parse_assignments(items: List[str]) -> Dict[str, List[str]]:
+    parsed = {}
+    for item in items:
+        name, _, values = item.partition("=")
+        parsed[name] = values.split(",")
+    return parsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Hyperparameter sweep over Evolution parameters.")
+    search = arg_parser.add_mutually_exclusive_group()
+    search.add_argument("--grid", nargs="*", default=[], metavar="NAME=V1,V2",
+                        help="grid search over given values")
+    search.add_argument("--random", type=int, default=0, metavar="N",
+                        help="random search with N configs, --range gives the ranges")
+    arg_parser.add_argument("--range", nargs="*", default=[], metavar="NAME=LOW,HIGH")
+    arg_parser.add_argument("--set", nargs="*", default=[], metavar="NAME=VALUE",
+                            help="parameters shared by all configs")
+    arg_parser.add_argument("--repeats", type=int, default=3)
+    arg_parser.add_argument("--processes", type=int, default=None)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--out", default="sweep.txt")
+    args = arg_parser.parse_args()
+
+    base = {name: _parse_value(values[0]) for name, values in _parse_assignments(args.set).items()}
+    configs = grid(**{name: [_parse_value(v) for v in values]
+                      for name, values in _parse_assignments(args.grid).items()})
+    if args.random:
+        ranges = {name: tuple(_parse_value(v) for v in values)
+                  for name, values in _parse_assignments(args.range).items()}
+        configs = random_search(args.random, random.Random(args.seed), **ranges)
+    results = run_sweep(configs, args.repeats, args.processes, args.seed, base)
+    write_summary(results, args.out)
+    print(f"{len(configs)} configs x {args.repeats} repeats written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
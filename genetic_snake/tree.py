@@ -1,12 +1,21 @@
-from random import randrange, random, choice
+from random import randrange, random, choice, Random
 import time
 import math
-import pickle
 import operator
 import copy
-from typing import List, Tuple, Dict
+import itertools
+import threading
+import weakref
+import tracemalloc
+from collections import namedtuple
+from functools import partial
+from typing import List, Sequence, Tuple, Dict
 from .snake import Entity, Game, Point, Direction
 from . import snake
+from . import nsga
+from . import novelty
+from . import adaptive
+from .scheduler import Scheduler
 
 
 class Rotation:
@@ -94,6 +103,84 @@ class Function:
         return False
 
 
+class SensorFacts:
+    """
+    What is known about sensors on one path of a decision tree.
+
+    A "world" is one possible reading of the sensors of one ray:
+    (ahead, visible, nearby wall, nearby snake, nearby food). Facts are kept
+    as bitmasks of worlds still possible for each rotation.
+    Invariants of Game._generate_state used:
+    - a non-empty tile ahead is also the visible entity
+    - visible food or snake is always in the nearby list (the wall is not
+      for rays going left or up, which stop before the border)
+    - nothing is behind the (border) wall
+    - there is one apple, so food is on at most one ray
+    """
+    WORLDS = []
+    for _ahead in (Entity.EMPTY, Entity.WALL, Entity.FOOD, Entity.SNAKE):
+        for _visible in (Entity.WALL, Entity.FOOD, Entity.SNAKE):
+            for _nearby in itertools.product((False, True), repeat=3):
+                _wall, _snake, _food = _nearby
+                if _ahead != Entity.EMPTY and _visible != _ahead:
+                    continue
+                if not {Entity.WALL: True, Entity.SNAKE: _snake, Entity.FOOD: _food}[_visible]:
+                    continue
+                if _visible == Entity.WALL and (_snake or _food):
+                    continue
+                WORLDS.append({
+                    snake.AHEAD: _ahead,
+                    snake.VISIBLE: _visible,
+                    snake.NEARBY: [e for e, present in zip((Entity.WALL, Entity.SNAKE, Entity.FOOD), _nearby)
+                                   if present],
+                })
+    ALL = (1 << len(WORLDS)) - 1
+    FOOD = sum(1 << i for i, w in enumerate(WORLDS)
+               if Entity.FOOD in (w[snake.AHEAD], w[snake.VISIBLE]) or Entity.FOOD in w[snake.NEARBY])
+    _TRUE_MASKS = {}
+
+    def __init__(self, masks=None):
+        self.masks = (self.ALL,) * len(Rotation.TYPES) if masks is None else masks
+
+    @classmethod
+    def true_mask(cls, function: Function) -> int:
+        key = (function.func_type, function.is_func)
+        mask = cls._TRUE_MASKS.get(key)
+        if mask is None:
+            mask = sum(1 << i for i, w in enumerate(cls.WORLDS)
+                       if function.is_func(w[function.func_type]))
+            cls._TRUE_MASKS[key] = mask
+        return mask
+
+    def decide(self, function: Function):
+        """
+        Return outcome of the test if it is known on this path, None otherwise.
+        """
+        mask = self.true_mask(function)
+        possible = self.masks[function.rotation.type]
+        if possible & mask == 0:
+            return False
+        if possible & ~mask == 0:
+            return True
+        return None
+
+    def assume(self, function: Function, outcome: bool) -> "SensorFacts":
+        mask = self.true_mask(function)
+        masks = list(self.masks)
+        masks[function.rotation.type] &= mask if outcome else ~mask
+        changed = True
+        while changed:
+            changed = False
+            for r, possible in enumerate(masks):
+                if possible and possible & ~self.FOOD == 0:
+                    # food is certainly on ray r
+                    for other in range(len(masks)):
+                        if other != r and masks[other] & self.FOOD:
+                            masks[other] &= ~self.FOOD
+                            changed = True
+        return SensorFacts(tuple(masks))
+
+
 class Generator:
     ROTATIONS = (
         Rotation.TO_LEFT,
@@ -101,8 +188,8 @@ class Generator:
         Rotation.NONE,
     )
 
-    def generate_function(self):
-        func_type = choice(Function.TYPES)
+    def generate_function(self, types=None):
+        func_type = choice(Function.TYPES if types is None else types)
         if func_type == snake.NEARBY:
             is_func = choice(Function.NEARBY_FUNCTIONS)
         else:
@@ -111,146 +198,407 @@ class Generator:
                         Function.FUNCTIONS_STR[is_func])
 
 
+def _data_key(data):
+    if data.is_terminal():
+        return data.type
+    return data.func_type, data.is_func, data.rotation.type
+
+
 class Node:
+    """
+    Immutable node of a decision tree.
+
+    Nodes are hash-consed: building a node equal to a living one returns that
+    node, so equal subtrees are one object shared by all trees of the
+    population (equality is identity). Operators never change nodes, they
+    return a new root rebuilt only along the changed paths.
+    """
     TERMINAL = 0
     FUNCTION = 1
     GEN = Generator()
+    __slots__ = ("data", "left", "right", "_size", "_height", "_depth_sum", "_kept", "__weakref__")
+    _DATA = {}  # canonical data object per node type
+    _TABLE = weakref.WeakValueDictionary()  # (data key, left, right) -> living node
+    # lookup and insertion are one step, threads building equal nodes get one object
+    _LOCK = threading.Lock()
+
+    def __new__(cls, data, left=None, right=None):
+        data_key = _data_key(data)
+        key = (data_key, left, right)
+        with cls._LOCK:
+            node = cls._TABLE.get(key)
+            if node is not None:
+                return node
+            node = object.__new__(cls)
+            setattr_ = object.__setattr__
+            setattr_(node, "data", cls._DATA.setdefault(data_key, data))
+            setattr_(node, "left", left)
+            setattr_(node, "right", right)
+            # cached subtree statistics
+            if left is None:
+                setattr_(node, "_size", 1)
+                setattr_(node, "_height", 0)
+                setattr_(node, "_depth_sum", 0)  # sum of node depths relative to this node
+            else:
+                setattr_(node, "_size", 1 + left._size + right._size)
+                setattr_(node, "_height", 1 + max(left._height, right._height))
+                setattr_(node, "_depth_sum", left._depth_sum + left._size + right._depth_sum + right._size)
+            cls._TABLE[key] = node
+        return node
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Node is immutable")
+
+    def __reduce__(self):
+        # flat preorder codes, pickling nested nodes would recurse per level
+        from . import encoding
+        return encoding.loads, (encoding.dumps(self),)
 
-    def __init__(self, data, parent=None):
-        self.left = None
-        self.right = None
-        self.data = data
-        self.parent = parent
+    def kept(self, rate: float, depth: int) -> float:
+        """
+        Probability that mutate_if replaces no node of the subtree rooted at
+        depth, product of (1 - min(1, rate * (d + 1))) over its nodes.
+        The last result is cached per node, subtrees not changed since the
+        previous mutation are not visited again.
+        """
+        results = []
+        stack = [(False, self, depth)]
+        while stack:
+            built, node, depth = stack.pop()
+            if built:
+                right = results.pop()
+                left = results.pop()
+                value = (1 - min(1.0, rate * (depth + 1))) * left * right
+                object.__setattr__(node, "_kept", (rate, depth, value))
+                results.append(value)
+                continue
+            cached = getattr(node, "_kept", None)
+            if cached is not None and cached[0] == rate and cached[1] == depth:
+                results.append(cached[2])
+            elif node.left is None:
+                value = 1 - min(1.0, rate * (depth + 1))
+                object.__setattr__(node, "_kept", (rate, depth, value))
+                results.append(value)
+            else:
+                stack.append((True, node, depth))
+                stack.append((False, node.right, depth + 1))
+                stack.append((False, node.left, depth + 1))
+        return results[0]
+
+    @classmethod
+    def live_count(cls) -> int:
+        """
+        Number of distinct nodes alive in this process.
+        """
+        return len(cls._TABLE)
 
     def evaluate(self, game):
-        if self.data.is_terminal():
-            return self.data
-        elif self.data.evaluate(game):
-            return self.left.evaluate(game)
-        else:
-            return self.right.evaluate(game)
+        node = self
+        while not node.data.is_terminal():
+            if node.data.evaluate(game):
+                node = node.left
+            else:
+                node = node.right
+        return node.data
+
+    def evaluate_traced(self, game, hits: Dict[int, int]):
+        """
+        Same as evaluate, counts visits of every node on the taken path.
+        Nodes are identified by preorder index, shared subtrees are counted
+        separately at each position.
+        """
+        node = self
+        index = 0
+        while True:
+            hits[index] = hits.get(index, 0) + 1
+            if node.data.is_terminal():
+                return node.data
+            elif node.data.evaluate(game):
+                node = node.left
+                index += 1
+            else:
+                index += 1 + node.left._size
+                node = node.right
 
     @staticmethod
-    def generate_random(depth=0, parent=None):
+    def generate_random(depth=0, config=None):
         """
         Generate random tree with probabilistic-based tree creation.
+        :param config: Evolution (class or instance) providing parameters
         """
-        if random() < (depth / Evolution.RESTRICT_DEPTH):
-            return Node.generate_random_terminal_node(depth, parent)
+        config = Evolution if config is None else config
+        if random() < (depth / config.RESTRICT_DEPTH):
+            return Node.generate_random_terminal_node(depth)
         else:
-            return Node.generate_random_function_node(depth, parent)
+            return Node.generate_random_function_node(depth, config)
 
     @staticmethod
-    def generate_random_terminal_node(depth, parent):
-        return Node(Rotation.generate_random(), parent)
+    def generate_random_terminal_node(depth):
+        return Node(Rotation.generate_random())
 
     @staticmethod
-    def generate_random_function_node(depth, parent):
-        n = Node(Node.GEN.generate_function(), parent)
-        n.left = Node.generate_random(depth + 1, n)
-        n.right = Node.generate_random(depth + 1, n)
-        return n
+    def generate_random_function_node(depth, config=None):
+        config = Evolution if config is None else config
+        data = Node.GEN.generate_function(config.FUNCTION_TYPES)
+        left = Node.generate_random(depth + 1, config)
+        right = Node.generate_random(depth + 1, config)
+        return Node(data, left, right)
 
     def print_tree(self, depth=0):
-        if depth == 0:
-            print(self.data)
-        else:
-            print('|' * (depth - 1), '-', self.data, sep='')
-        if self.left is not None:
-            self.left.print_tree(depth+1)
-        if self.right is not None:
-            self.right.print_tree(depth+1)
+        for line in self.lines(depth):
+            print(line, end='')
 
-    def tree_string(self, depth=0):
+    def tree_string(self, depth=0, hits=None):
         """
         Return string representation of used decision tree.
+        :param hits: optional visit counts (see evaluate_traced) shown after nodes
         """
-        buffer = ""
-        if depth > 0:
-            buffer += "|" * (depth - 1) + "-"
-        buffer += str(self.data) + '\n'
-        if self.left is not None:
-            buffer += self.left.tree_string(depth + 1)
-        if self.right is not None:
-            buffer += self.right.tree_string(depth + 1)
-        return buffer
+        return "".join(self.lines(depth, hits))
 
-    def prune(self):
+    def write_tree(self, handle, hits=None):
+        """
+        Write tree_string to text stream line by line, for very large trees.
+        """
+        for line in self.lines(hits=hits):
+            handle.write(line)
+
+    def lines(self, depth=0, hits=None):
+        """
+        Generate lines of tree_string in preorder.
+        """
+        stack = [(self, depth)]
+        index = 0
+        while stack:
+            node, depth = stack.pop()
+            prefix = "|" * (depth - 1) + "-" if depth > 0 else ""
+            if hits is not None:
+                yield "{}{} [{}]\n".format(prefix, node.data, hits.get(index, 0))
+            else:
+                yield "{}{}\n".format(prefix, node.data)
+            index += 1
+            if node.right is not None:
+                stack.append((node.right, depth + 1))
+            if node.left is not None:
+                stack.append((node.left, depth + 1))
+
+    def _transform(self, visit, state=None, combine=None) -> "Node":
         """
-        Remove redundant nodes. Works in-place.
-        """
-        if not self.data.is_terminal():
-            if self.left.data.is_terminal() and self.right.data.is_terminal():
-                left_type = self.left.data.type
-                right_type = self.right.data.type
-                if left_type == right_type:
-                    self.data = self.left.data
-                    self.left = None
-                    self.right = None
-                    if self.parent:
-                        self.parent.prune()
+        Rebuild the tree top-down without recursion.
+        :param visit: visit(node, state) returns node to use instead and states
+            of its children, or None to keep the returned subtree as is
+        :param combine: combine(data, left, right) builds function nodes, Node by default
+        """
+        combine = Node if combine is None else combine
+        results = []
+        stack = [(False, self, state)]
+        while stack:
+            built, node, state = stack.pop()
+            if built:
+                right = results.pop()
+                left = results.pop()
+                results.append(combine(node.data, left, right))
+                continue
+            node, states = visit(node, state)
+            if node.left is None or states is None:
+                results.append(node)
             else:
-                self.left.prune()
-                # right can be deleted on parent pruning
-                if self.right is not None:
-                    self.right.prune()
+                stack.append((True, node, None))
+                stack.append((False, node.right, states[1]))
+                stack.append((False, node.left, states[0]))
+        return results[0]
+
+    @staticmethod
+    def _collapse(data, left, right) -> "Node":
+        # same subtree on both branches makes the test redundant
+        if left is right:
+            return left
+        return Node(data, left, right)
+
+    def prune(self) -> "Node":
+        """
+        Remove redundant nodes. Returns pruned tree.
+        """
+        return self._transform(lambda node, state: (node, (None, None)), combine=Node._collapse)
 
-    def mutate_if(self, depth=0):
+    def simplify(self) -> "Node":
+        """
+        Remove tests whose outcome is already known from tests higher on the
+        same path (repeated or implied/contradicting conditions).
+        Behaviour does not change. Returns simplified tree.
+        """
+        def visit(node, facts):
+            while not node.data.is_terminal():
+                outcome = facts.decide(node.data)
+                if outcome is None:
+                    return node, (facts.assume(node.data, True), facts.assume(node.data, False))
+                node = node.left if outcome else node.right
+            return node, None
+
+        return self._transform(visit, SensorFacts()).prune()
+
+    def prune_unreached(self, hits: Dict[int, int]) -> "Node":
+        """
+        Replace function nodes with one never visited child by the other child.
+        :param hits: visit counts from evaluate_traced
+        :return: pruned tree
         """
-        Mutate nodes based on base rate and depth. Works in-place.
+        def visit(node, index):
+            while node.left is not None:
+                left_index = index + 1
+                right_index = index + 1 + node.left._size
+                if hits.get(left_index, 0) == 0:
+                    node, index = node.right, right_index
+                elif hits.get(right_index, 0) == 0:
+                    node, index = node.left, left_index
+                else:
+                    return node, (left_index, right_index)
+            return node, None
+
+        return self._transform(visit, 0)
+
+    def mutate_if(self, depth=0, config=None) -> "Node":
+        """
+        Mutate nodes based on base rate and depth. Returns mutated tree.
         Does subtree mutation.
         """
-        if random() < Evolution.BASE_MUTATION_RATE * (depth + 1):
-            # @TODO: continue mutating or break?
-            self._mutate(depth)
-            if random() > Evolution.MUTATION_CHANCE:
-                return
-        if self.left is not None:
-            self.left.mutate_if(depth + 1)
-        if self.right is not None:
-            self.right.mutate_if(depth + 1)
-
-    def _mutate(self, depth=0):
-        # @TODO: how deep?
-        replacement = Node.generate_random(depth, self.parent)
-        self.data = replacement.data
-        self.left = replacement.left
-        self.right = replacement.right
+        config = Evolution if config is None else config
 
-    def crossover(self, other):
+        def visit(node, depth):
+            if random() < config.BASE_MUTATION_RATE * (depth + 1):
+                # @TODO: continue mutating or break?
+                node = Node.generate_random(depth, config)
+                if random() > config.MUTATION_CHANCE:
+                    return node, None
+            return node, (depth + 1, depth + 1)
+
+        return self._transform(visit, depth)
+
+    def mutate_random(self, config=None) -> "Node":
+        """
+        Subtree mutation with the same distribution as mutate_if, without
+        visiting every node. mutate_if replaces a node at depth d with
+        probability min(1, BASE_MUTATION_RATE * (d + 1)) unless an ancestor was
+        replaced (further mutations inside a replacement only redraw a random
+        subtree). Replaced nodes are drawn top-down from the probabilities that
+        subtrees stay unchanged (see kept), descending only into subtrees
+        containing one. These are cached, so a mutation costs O(depth) plus
+        the size of subtrees new since the last mutation. Returns mutated tree.
+        """
+        config = Evolution if config is None else config
+        rate = config.BASE_MUTATION_RATE
+
+        def visit(node, state):
+            # state is (depth, kept) of a subtree with at least one replaced node
+            if state is None:
+                return node, None
+            depth, node_kept = state
+            if node.left is None or random() * (1 - node_kept) < rate * (depth + 1):
+                return Node.generate_random(depth, config), None
+            left_kept = node.left.kept(rate, depth + 1)
+            right_kept = node.right.kept(rate, depth + 1)
+            left_only = (1 - left_kept) * right_kept
+            right_only = left_kept * (1 - right_kept)
+            r = random() * (1 - left_kept * right_kept)
+            left = (depth + 1, left_kept) if r < left_only or r >= left_only + right_only else None
+            right = (depth + 1, right_kept) if r >= left_only else None
+            return node, (left, right)
+
+        root_kept = self.kept(rate, 0)
+        if random() < root_kept:
+            return self
+        return self._transform(visit, (0, root_kept))
+
+    def random_node(self, depth_weighted=False) -> Tuple["Node", List[Tuple["Node", bool]]]:
+        """
+        Pick random node of the subtree in O(depth) using cached sizes.
+        :param depth_weighted: pick node with weight (depth + 1), uniformly otherwise
+        :return: node and path to it, (ancestor, went left) pairs from this node
+        """
+        node = self
+        path = []
+        while True:
+            if node.left is None:
+                return node, path
+            depth = len(path)
+            left = node.left
+            right = node.right
+            if depth_weighted:
+                # subtree weight at depth d is depth_sum + (d + 1) * size
+                own = depth + 1
+                left_weight = left._depth_sum + (depth + 2) * left._size
+                total = own + left_weight + right._depth_sum + (depth + 2) * right._size
+            else:
+                own = 1
+                left_weight = left._size
+                total = node._size
+            r = random() * total
+            if r < own:
+                return node, path
+            went_left = r < own + left_weight
+            path.append((node, went_left))
+            node = left if went_left else right
+
+    @staticmethod
+    def replace(path: List[Tuple["Node", bool]], node: "Node") -> "Node":
+        """
+        Root of the tree with node at the end of path (see random_node).
+        Only the path is rebuilt, the rest is shared.
+        """
+        for ancestor, went_left in reversed(path):
+            if went_left:
+                node = Node(ancestor.data, node, ancestor.right)
+            else:
+                node = Node(ancestor.data, ancestor.left, node)
+        return node
+
+    def crossover(self, other) -> Tuple["Node", "Node"]:
         """
         Crossover two trees. Switches two randomly selected subtrees.
-        Works in-place.
+        Returns both new trees.
         """
-        first = []
-        self.flatten(first)
-        second = []
-        other.flatten(second)
+        first_node, first_path = self.random_node()
+        second_node, second_path = other.random_node()
+        return Node.replace(first_path, second_node), Node.replace(second_path, first_node)
 
-        first_node = choice(first)
-        second_node = choice(second)
-        self._switch_nodes(first_node, second_node)
+    def size(self) -> int:
+        """
+        Number of nodes in the tree.
+        """
+        return self._size
 
-    @staticmethod
-    def _switch_nodes(first, second):
-        second_data = second.data
-        second_left = second.left
-        second_right = second.right
+    def depth(self) -> int:
+        """
+        Number of edges on the longest path from this node to a terminal.
+        """
+        return self._height
 
-        second.data = first.data
-        second.left = first.left
-        second.right = first.right
+    def flatten(self, container: List["Node"]) -> List["Node"]:
+        """
+        Append all nodes in preorder to container and return it.
+        Shared subtrees appear once per position.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            container.append(node)
+            if node.right is not None:
+                stack.append(node.right)
+            if node.left is not None:
+                stack.append(node.left)
+        return container
+
+
+# evaluation game: seed of apple placement (None for global random) and board size
+Episode = namedtuple("Episode", "seed width height")
+EpisodeResult = namedtuple("EpisodeResult", "seed width height score turns")
 
-        first.data = second_data
-        first.left = second_left
-        first.right = second_right
 
-    def flatten(self, container): # @TODO: container=[] and return?
-        container.append(self)
-        if self.left is not None:
-            self.left.flatten(container)
-        if self.right is not None:
-            self.right.flatten(container)
+def seeded(episodes: Sequence[Episode]) -> List[Episode]:
+    """
+    Episodes with a seed drawn for every unseeded one, so their games can be
+    played elsewhere (evaluators) and replayed.
+    """
+    return [e if e.seed is not None else e._replace(seed=randrange(Evolution.SEED_RANGE)) for e in episodes]
 
 
 class Individual:
@@ -258,38 +606,166 @@ class Individual:
     LOW_SCORE = 10
     MAX_TURNS_LOW = 500
     MAX_TURNS_ZERO = 100
+    _ids = itertools.count()
 
-    def __init__(self, root: Node):
+    def __init__(self, root: Node, config=None):
+        """
+        Fitness is resolved lazily: on first use the individual plays its
+        evaluation games, unless it was evaluated (evaluate_batch) or its
+        results were set before.
+        :param config: Evolution (class or instance) whose evaluation games
+            (Evolution.episodes) are played then, one random game on the default
+            board if None; copies share it
+        """
         self.root = root
-        self.fitness = 0
-        self.score = 0
-        self.turns = 0
-        self.calculate_fitness()
+        self.config = config
+        self.uid = next(Individual._ids)
+        self.parents = ()  # type: Tuple[int, ...]
+        self.episodes = []  # type: List[EpisodeResult]
+        # set by nsga.select
+        self.rank = 0
+        self.crowding = 0.0
+        # set in novelty selection mode
+        self.novelty = 0.0
+        self.novelty_score = 0.0
+        self._behaviour = None
+        self._fitness = None  # None until evaluated
+        self._score = 0
+        self._turns = 0
+
+    @property
+    def evaluated(self) -> bool:
+        return self._fitness is not None
+
+    def _resolve(self):
+        if self._fitness is None:
+            self.calculate_fitness(None if self.config is None else Evolution.episodes(self.config))
+
+    @property
+    def fitness(self) -> float:
+        self._resolve()
+        return self._fitness
+
+    @fitness.setter
+    def fitness(self, value: float):
+        self._fitness = value
+
+    @property
+    def score(self) -> int:
+        self._resolve()
+        return self._score
+
+    @score.setter
+    def score(self, value: int):
+        self._score = value
+
+    @property
+    def turns(self) -> int:
+        self._resolve()
+        return self._turns
+
+    @turns.setter
+    def turns(self, value: int):
+        self._turns = value
+
+    def invalidate(self):
+        """
+        Forget results, e.g. after the tree changed.
+        """
+        self.episodes = []
+        self._behaviour = None
+        self._fitness = None
+        self._score = 0
+        self._turns = 0
 
-    def calculate_fitness(self):
-        result = self.run_game()
+    def calculate_fitness(self, episodes: Sequence[Episode] = None, behaviour=False):
+        """
+        Play evaluation games, one random game on the default board by default.
+        Seeds are drawn for unseeded games, so results can be replayed.
+        :param behaviour: record the behaviour descriptor too (see novelty module)
+        """
+        if episodes is None:
+            episodes = [Episode(None, Game.WIDTH, Game.HEIGHT)]
+        results = []
+        recorded = novelty.Behaviour() if behaviour else None
+        episodes = seeded(episodes)
+        for episode in episodes:
+            result = self.run_game(episode.seed, width=episode.width, height=episode.height, behaviour=recorded)
+            results.append(EpisodeResult(*episode, result["score"], result["turns"]))
+        self.set_results(results, None if recorded is None else recorded.descriptor())
+
+    def set_results(self, results: Sequence[EpisodeResult], behaviour: novelty.Descriptor = None):
+        """
+        Fitness is the mean fitness of episodes, score and turns are totals.
+        :param behaviour: descriptor recorded in these games, replayed on demand if None
+        """
+        self.episodes = list(results)
+        self._behaviour = behaviour
+        self._fitness = sum(self.episode_fitness(r.score, r.turns) for r in results) / len(results)
+        self._score = sum(r.score for r in results)
+        self._turns = sum(r.turns for r in results)
+
+    @staticmethod
+    def episode_fitness(score: int, turns: int) -> float:
         # @TODO: ok?
-        # self.fitness = result["score"]
+        # return score
         # @TODO: favor smaller trees?
-        # self.fitness = result["score"] + (result["turns"] / self.MAX_TURNS)
-        self.fitness = result["score"] + (result["score"] / result["turns"])
-
-        self.score = result["score"]
-        self.turns = result["turns"]
+        # return score + (turns / Individual.MAX_TURNS)
+        return score + (score / turns)
 
     def prune(self):
-        self.root.prune()
+        self.root = self.root.prune()
+
+    def coverage(self, episodes: Sequence[Episode] = None) -> Dict[int, int]:
+        """
+        Count node visits (by preorder index) over given games.
+        Replays the evaluation games by default, one random game if there are none.
+        """
+        if episodes is None:
+            episodes = self.episodes or [Episode(None, Game.WIDTH, Game.HEIGHT)]
+        hits = {}
+        for episode in episodes:
+            self.run_game(episode.seed, hits, episode.width, episode.height)
+        return hits
+
+    def behaviour(self) -> novelty.Descriptor:
+        """
+        Behaviour descriptor in the evaluation games, see novelty module.
+        Replays the games the first time unless it was recorded during evaluation.
+        """
+        if self._behaviour is None:
+            behaviour = novelty.Behaviour()
+            for episode in self.episodes:
+                self.run_game(episode.seed, width=episode.width, height=episode.height, behaviour=behaviour)
+            self._behaviour = behaviour.descriptor()
+        return self._behaviour
+
+    def prune_unreached(self, episodes: Sequence[Episode] = None):
+        """
+        Remove branches never taken in given games (evaluation games by default).
+        Behaviour in those games does not change, in other games it may.
+        """
+        self.root = self.root.prune_unreached(self.coverage(episodes)).prune()
 
-    def mutate(self):
+    def simplify(self):
+        self.root = self.root.simplify()
+
+    def mutate(self, config=None):
         # nodes = []
         # self.root.flatten(nodes)
         # random_node = choice(nodes)
         # random_node._mutate(3)
 
-        self.root.mutate_if()
+        self.root = self.root.mutate_random(config)
+        self.invalidate()
 
     def crossover(self, other):
-        self.root.crossover(other.root)
+        self.root, other.root = self.root.crossover(other.root)
+        self.invalidate()
+        other.invalidate()
+        parents = self.parents + other.parents
+        self.parents = parents
+        other.parents = parents
 
     @staticmethod
     def is_block(entity):
@@ -299,8 +775,11 @@ class Individual:
     def is_food(entity):
         return entity == Entity.FOOD
 
-    def get_direction(self, game: Game):
-        rotation = self.root.evaluate(game)
+    def get_direction(self, game: Game, hits=None):
+        if hits is None:
+            rotation = self.root.evaluate(game)
+        else:
+            rotation = self.root.evaluate_traced(game, hits)
         return Direction(rotation.rotate(game.current_direction.type))
 
     @staticmethod
@@ -325,53 +804,115 @@ class Individual:
             pos[1] += direction.y
             distance += 1
 
-    def run_game(self) -> Dict[str, int]:
+    def run_game(self, seed=None, hits=None, width=Game.WIDTH, height=Game.HEIGHT,
+                 behaviour: novelty.Behaviour = None) -> Dict[str, int]:
         """
         Run one game using own strategy.
+        :param seed: seed for apple placement, global random if None
+        :param hits: if given, node visits are counted into it
+        :param behaviour: if given, moves are recorded into it
         :return: score and number of turns taken
         """
-        game = Game()
+        game = Game(height, width, rng=None if seed is None else Random(seed))
         turn = 0
         while game.running and turn < Individual.MAX_TURNS:
             if game.score == 0 and turn > Individual.MAX_TURNS_ZERO:
                 break
             if game.score < Individual.LOW_SCORE and turn > Individual.MAX_TURNS_LOW:
                 break
-            direction = self.get_direction(game)
+            direction = self.get_direction(game, hits)
+            if behaviour is not None:
+                behaviour.record(game, direction)
             game.move(direction)
             turn += 1
 
+        if behaviour is not None:
+            behaviour.finish(game.score, turn)
         return {"score": game.score, "turns": turn}
 
     def __deepcopy__(self, memodict={}):
-        return pickle.loads(pickle.dumps(self, -1))
+        """
+        Copy is a new individual with this one as its parent.
+        Nodes are immutable, so the tree is shared.
+        """
+        ind = copy.copy(self)
+        ind.uid = next(Individual._ids)
+        ind.parents = (self.uid,)
+        return ind
 
 
 class Population:
-    def __init__(self, start_size=0):
+    def __init__(self, start_size=0, config=None, evaluator=None):
+        """
+        :param start_size: number of random individuals, evaluated in one batch
+        :param config: Evolution (class or instance) providing parameters
+        :param evaluator: backend evaluating random individuals, see evaluation module
+        """
+        self.config = Evolution if config is None else config
         self.pop = []  # type: List[Individual]
         for _ in range(start_size):
-            i = Individual(Node.generate_random())
+            i = Individual(Population.random_root(self.config), self.config)
             i.prune()
             self.pop.append(i)
+        evaluate_batch(self.pop, evaluator, partial(Evolution.episodes, self.config))
+
+    @staticmethod
+    def random_root(config) -> Node:
+        """
+        Random tree within limits of config (Evolution class or instance).
+        """
+        root = Node.generate_random(config=config)
+        while not Evolution.within_limits(config, root):
+            root = Node.generate_random(config=config)
+        return root
 
     def select_two(self) -> Tuple[Individual, Individual]:
         """
         Select two individuals with tournament selection. Returns copies.
         """
-        tournament_size = int(Evolution.POPULATION_SIZE * Evolution.TOURNAMENT_SIZE)
+        first, second = self.select_parents()
+        return copy.deepcopy(first), copy.deepcopy(second)
+
+    def select_parents(self) -> Tuple[Individual, Individual]:
+        """
+        Select two individuals with tournament selection. Returns originals.
+        """
+        tournament_size = int(self.config.POPULATION_SIZE * self.config.TOURNAMENT_SIZE)
         first = self._tournament_select(tournament_size)
         second = self._tournament_select(tournament_size)
-        return copy.deepcopy(first), copy.deepcopy(second)
+        return first, second
 
     def _tournament_select(self, tournament_size) -> Individual:
+        if self.config.SELECTION == Evolution.NSGA2:
+            better = Population._less_crowded
+        elif self.config.SELECTION == Evolution.NOVELTY:
+            better = Population._more_novel
+        else:
+            better = Population._fitter
         best = choice(self.pop)
         for _ in range(tournament_size):
             cur = choice(self.pop)
-            if cur.fitness > best.fitness:
+            if better(cur, best):
                 best = cur
         return best
 
+    @staticmethod
+    def _fitter(first: Individual, second: Individual) -> bool:
+        return first.fitness > second.fitness
+
+    @staticmethod
+    def _more_novel(first: Individual, second: Individual) -> bool:
+        return first.novelty_score > second.novelty_score
+
+    @staticmethod
+    def _less_crowded(first: Individual, second: Individual) -> bool:
+        """
+        Crowded comparison of NSGA-II: better front, then less crowded.
+        """
+        if first.rank != second.rank:
+            return first.rank < second.rank
+        return first.crowding > second.crowding
+
     def get_best(self) -> Individual:
         return max(self.pop, key=operator.attrgetter('fitness'))
 
@@ -384,22 +925,80 @@ class Population:
     def append(self, individual: Individual):
         self.pop.append(individual)
 
+    SUMMARY = "Average fitness: {:6.3f} (score: {:3.3f}) Best fitness: {:6.3f} (score: {:2d}, turns: {:3d})"
+
     def __str__(self):
-        return "Average fitness: {:6.3f} (score: {:3.3f}) Best fitness: {:6.3f} (score: {:2d}, turns: {:3d})".format(
+        return self.SUMMARY.format(
             self.get_avg_fitness(), self.get_avg_score(), self.get_best().fitness, self.get_best().score, self.get_best().turns
         )
 
 
 class Evolution:
+    """
+    Class attributes are defaults (changed by GUI), instances can override them.
+    """
     RESTRICT_DEPTH = 6.0
+    FUNCTION_TYPES = tuple(Function.TYPES)  # sensors used by generated trees
     BASE_MUTATION_RATE = 0.05
     MUTATION_CHANCE = 0.05
     CROSSOVER_RATE = 0.05
     GENERATIONS = 80
     POPULATION_SIZE = 200
-    MAX_RUNNING_TIME = 15000
+    MAX_RUNNING_TIME = 15000  # seconds
+    # shrink offspring count so the remaining generations fit into MAX_RUNNING_TIME
+    ADAPTIVE_POPULATION = False
+    MIN_POPULATION_SIZE = 20
+    # seconds of evaluation between checks of deadline and stop request, 0 checks per generation
+    PREEMPT_INTERVAL = 1.0
     PRINT_RATE = 5
     TOURNAMENT_SIZE = 0.05
+    SEED_RANGE = 2 ** 32
+    # fitness is the mean over EVAL_SEEDS games on each of EVAL_BOARDS (width, height)
+    EVAL_SEEDS = 1
+    EVAL_BOARDS = ((Game.WIDTH, Game.HEIGHT),)
+    # remove branches not taken in the evaluation games, costs replaying them
+    PRUNE_UNREACHED = False
+    # remove redundant and contradicting tests from offspring, keeps behaviour
+    SIMPLIFY = True
+    # offspring over limits are replaced by a copy of their parent
+    MAX_DEPTH = 17
+    MAX_SIZE = 200
+    # offspring predicted by a surrogate model to have fitness below threshold are
+    # not simulated, their places are kept by the best of the old population, see surrogate module
+    SURROGATE = False
+    SURROGATE_THRESHOLD = 1.0
+    SURROGATE_CONFIDENCE = 0.8  # predicted probability of fitness below threshold
+    SURROGATE_EXPLORE = 0.1  # probability of evaluating predicted hopeless offspring anyway
+    SURROGATE_MIN_SAMPLES = 200
+    # offspring with the same tree as another individual of the new population
+    # are replaced by fresh random individuals before evaluation
+    REPLACE_DUPLICATES = False
+    # when unique behaviours fall below this fraction of the population, its worst
+    # RESTART_FRACTION is replaced by fresh random individuals, 0 disables restarts
+    RESTART_DIVERSITY = 0.0
+    RESTART_FRACTION = 0.5
+    # memory accounting passed to LogHandler.log_memory every generation, see memory module
+    MEMORY_STATS = False
+    MEMORY_TOP = 0  # largest allocation sites reported, traces allocations (slow), 0 disables
+    MEMORY_WARN = 0  # bytes above which LogHandler.warn_memory is called, 0 disables
+    MEMORY_LIMIT = 0  # estimated bytes above which history (novelty archive) is pruned, 0 disables
+    # CROSSOVER_RATE and MUTATION_CHANCE of a run follow the fitness gained over parents
+    # per simulated turn by offspring of each operator, see adaptive module
+    ADAPTIVE_OPERATORS = False
+    ADAPTIVE_MIN_RATE = 0.01
+    ADAPTIVE_MAX_RATE = 0.5  # copies of parents are the baseline, some must remain
+    # selection modes
+    TOURNAMENT = "tournament"
+    NSGA2 = "nsga2"  # score, score per turn and tree size as separate objectives
+    NOVELTY = "novelty"  # tournament on novelty of behaviour, see novelty module
+    SELECTION = TOURNAMENT
+    # novelty is the mean behaviour distance to NOVELTY_K nearest neighbours in population and archive
+    NOVELTY_K = 15
+    NOVELTY_WEIGHT = 1.0  # selection score blends novelty (1) and fitness (0), both relative to the best
+    NOVELTY_ARCHIVE_RATE = 0.02  # probability of archiving behaviour of an individual
+    # evaluate on a pool of this many threads (evaluation.ThreadPoolEvaluator), scales on
+    # free-threaded CPython only; 0 evaluates in the calling thread (LocalEvaluator)
+    EVALUATION_THREADS = 0
 
     @classmethod
     def change_mutation_rate(cls, value):
@@ -417,47 +1016,324 @@ class Evolution:
     def change_restrict_depth(cls, value):
         Evolution.RESTRICT_DEPTH = float(value)
 
-    def __init__(self):
+    def __init__(self, archive=None, evaluator=None, stop=None, surrogate=None, **config):
+        """
+        :param archive: optional archive.Archive storing every generation
+        :param evaluator: backend evaluating offspring, see evaluation module
+        :param stop: optional Event, run stops soon after it is set
+        :param surrogate: surrogate.Surrogate screening offspring (e.g. trained
+            on an archive), created from SURROGATE_* parameters if SURROGATE is set
+        :param config: parameters of this run overriding class defaults,
+            e.g. Evolution(POPULATION_SIZE=100, CROSSOVER_RATE=0.1)
+        """
+        for name, value in config.items():
+            if not name.isupper() or not hasattr(Evolution, name):
+                raise TypeError(f"Unknown Evolution parameter {name}")
+            setattr(self, name, value)
         self.finished = False
-
-    def run(self, log_handler):
-        start_time = time.time()
-        population = Population(Evolution.POPULATION_SIZE)
+        self.archive = archive
+        # in-process evaluators record behaviour, others are replayed for it
+        behaviour = self.SELECTION == Evolution.NOVELTY
+        if evaluator is None and self.EVALUATION_THREADS:
+            from .evaluation import ThreadPoolEvaluator
+            evaluator = ThreadPoolEvaluator(self.EVALUATION_THREADS, behaviour)
+        self.evaluator = LocalEvaluator(behaviour) if evaluator is None else evaluator
+        self.stop = stop
+        self.simulated_turns = 0  # turns of all evaluation games of the last run
+        self.behaviours = novelty.BehaviourArchive()  # used in NOVELTY selection mode
+        if surrogate is None and self.SURROGATE:
+            from .surrogate import Surrogate
+            surrogate = Surrogate(self.SURROGATE_THRESHOLD, self.SURROGATE_CONFIDENCE,
+                                  self.SURROGATE_EXPLORE, self.SURROGATE_MIN_SAMPLES)
+        self.surrogate = surrogate
+        from .diversity import DiversityTracker
+        self.diversity = DiversityTracker()
+        self.operators = None
+        if self.ADAPTIVE_OPERATORS:
+            self.operators = adaptive.OperatorController(
+                {adaptive.CROSSOVER: self.CROSSOVER_RATE, adaptive.MUTATION: self.MUTATION_CHANCE},
+                self.ADAPTIVE_MIN_RATE, self.ADAPTIVE_MAX_RATE)
+
+    def run(self, log_handler) -> Individual:
+        """
+        Evolve until GENERATIONS, MAX_RUNNING_TIME or stop request.
+        Evaluation of a generation (the first one too) is interrupted by the
+        deadline or stop request, individuals evaluated so far are kept.
+        :return: best individual found, None if stopped before any was evaluated
+        """
+        scheduler = Scheduler(self.MAX_RUNNING_TIME, self.stop)
+        tracing = self.MEMORY_TOP and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if self.archive is not None:
+            self.archive.start_run()
+        self.simulated_turns = 0
+        population = Population(config=self)
+        population.pop = self._evaluate([self._random_individual() for _ in range(self.POPULATION_SIZE)],
+                                        scheduler)
+        if not population.pop:
+            self.finished = True
+            if tracing:
+                tracemalloc.stop()
+            log_handler.log_time(scheduler.elapsed())
+            return None
+        self._archive_evaluated(population.pop, 0)
         generation = 0
-        log_handler.add_population(population, generation)
-        for generation in range(1, Evolution.GENERATIONS + 1):
-            if self.finished:
+        if self.SELECTION == Evolution.NOVELTY:
+            self._score_novelty(population)
+        log_handler.log_diversity(self.diversity.measure(population.pop, generation))
+        self._add_population(log_handler, population, generation)
+        self._account_memory(log_handler, population, generation)
+        best = population.get_best()
+        if self.SELECTION == Evolution.NSGA2:
+            nsga.select(population.pop, len(population.pop))
+        for generation in range(1, self.GENERATIONS + 1):
+            if self.finished or scheduler.expired():
+                self.finished = True
                 break
-            new_population = Population()
+            new_population = Population(config=self)
 
-            new_population.append(copy.deepcopy(population.get_best()))
+            if self.SELECTION == Evolution.NSGA2:
+                # parents compete with offspring, no explicit elitism needed
+                count = self.POPULATION_SIZE
+            else:
+                new_population.append(copy.deepcopy(population.get_best()))
+                count = self.POPULATION_SIZE - 1
+            if self.ADAPTIVE_POPULATION:
+                count = scheduler.plan(self.GENERATIONS - generation + 1, count,
+                                       min(count, self.MIN_POPULATION_SIZE))
+            offspring = self._breed(population, count)
+            if self.surrogate is not None:
+                offspring = self._screen(offspring)
+            replaced = 0
+            if self.REPLACE_DUPLICATES:
+                # NSGA-II offspring compete with parents, copies of them are duplicates too
+                seen = population.pop if self.SELECTION == Evolution.NSGA2 else new_population.pop
+                replaced = self._replace_duplicates(offspring, seen)
+            offspring = self._evaluate(offspring, scheduler)
+            self._archive_evaluated(offspring, generation)
+            if self.operators is not None:
+                rates = self.operators.update(offspring)
+                self.CROSSOVER_RATE = rates[adaptive.CROSSOVER]
+                self.MUTATION_CHANCE = rates[adaptive.MUTATION]
+                log_handler.log_operators(self.operators)
+            if self.surrogate is not None:
+                self.surrogate.update(offspring)
+                log_handler.log_surrogate(self.surrogate)
+
+            if self.SELECTION == Evolution.NSGA2:
+                new_population.pop = nsga.select(population.pop + offspring, self.POPULATION_SIZE)
+            else:
+                if len(offspring) < count:
+                    # screened out or preempted, unevaluated places are kept by the best of the old population
+                    survivors = sorted(population.pop, key=operator.attrgetter('fitness'), reverse=True)
+                    offspring += survivors[1:1 + count - len(offspring)]
+                for ind in offspring:
+                    new_population.append(ind)
 
-            while len(new_population.pop) < Evolution.POPULATION_SIZE:
-                (first, second) = population.select_two()
-                if random() < Evolution.CROSSOVER_RATE:
-                    first.crossover(second)
+            population = new_population
+            best = max(best, population.get_best(), key=operator.attrgetter('fitness'))
+            diversity = self.diversity.measure(population.pop, generation, replaced)
+            if diversity.unique_behaviours < self.RESTART_DIVERSITY * diversity.size and not scheduler.expired():
+                diversity = diversity._replace(restarted=self._restart(population, scheduler, generation))
+            if self.SELECTION == Evolution.NOVELTY:
+                self._score_novelty(population)
+
+            if scheduler.expired():
+                self.finished = True
 
-                if random() < Evolution.MUTATION_CHANCE:
-                    first.mutate()
+            log_handler.log_diversity(diversity)
+            self._add_population(log_handler, population, generation)
+            self._account_memory(log_handler, population, generation)
 
-                first.prune()
-                first.calculate_fitness()
-                new_population.append(first)
-                if len(new_population.pop) < Evolution.POPULATION_SIZE:
-                    if random() < Evolution.MUTATION_CHANCE:
-                        second.mutate()
-                    second.prune()
-                    second.calculate_fitness()
-                    new_population.append(second)
+        if tracing:
+            tracemalloc.stop()
+        log_handler.log_time(scheduler.elapsed())
+        return best
 
-            population = new_population
+    def _screen(self, offspring: List[Individual]) -> List[Individual]:
+        """
+        Drop offspring predicted hopeless, they are never simulated.
+        :return: offspring to evaluate
+        """
+        accepted, rejected = self.surrogate.screen(offspring)
+        self.surrogate.saved += len(rejected)
+        return accepted
 
-            if (time.time() - start_time) > Evolution.MAX_RUNNING_TIME:
-                self.finished = True
+    def _random_individual(self) -> Individual:
+        ind = Individual(Population.random_root(self), self)
+        ind.prune()
+        return ind
+
+    def _replace_duplicates(self, offspring: List[Individual], seen: List[Individual]) -> int:
+        """
+        Replace offspring with a tree in seen or in earlier offspring by fresh random individuals.
+        :return: number of replaced
+        """
+        duplicates = self.diversity.duplicates(offspring, seen)
+        for i in duplicates:
+            offspring[i] = self._random_individual()
+        return len(duplicates)
+
+    def _restart(self, population: Population, scheduler: Scheduler, generation: int) -> int:
+        """
+        Replace the worst RESTART_FRACTION of population by evaluated fresh random individuals.
+        :return: number of replaced, fewer if the scheduler expired
+        """
+        count = int(len(population.pop) * self.RESTART_FRACTION)
+        fresh = self._evaluate([self._random_individual() for _ in range(count)], scheduler)
+        self._archive_evaluated(fresh, generation)
+        survivors = sorted(population.pop, key=operator.attrgetter('fitness'), reverse=True)
+        population.pop = survivors[:len(survivors) - len(fresh)] + fresh
+        if self.SELECTION == Evolution.NSGA2:
+            nsga.select(population.pop, len(population.pop))
+        return len(fresh)
+
+    def _score_novelty(self, population: Population):
+        """
+        Set novelty and selection score of individuals, archive some behaviours.
+        Games of individuals evaluated without recording behaviour (remote and
+        shared memory backends) are replayed for it.
+        """
+        self.simulated_turns += sum(ind.turns for ind in population.pop if ind._behaviour is None)
+        points = [ind.behaviour() for ind in population.pop]
+        for ind, value in zip(population.pop, novelty.novelty(points, self.behaviours, self.NOVELTY_K)):
+            ind.novelty = value
+        max_novelty = max(ind.novelty for ind in population.pop) or 1.0
+        max_fitness = max(ind.fitness for ind in population.pop) or 1.0
+        for ind in population.pop:
+            ind.novelty_score = (self.NOVELTY_WEIGHT * ind.novelty / max_novelty +
+                                 (1 - self.NOVELTY_WEIGHT) * ind.fitness / max_fitness)
+        for point in points:
+            if random() < self.NOVELTY_ARCHIVE_RATE:
+                self.behaviours.add(point)
+
+    def _evaluate(self, offspring: List[Individual], scheduler: Scheduler) -> List[Individual]:
+        """
+        Evaluate offspring in chunks of about PREEMPT_INTERVAL seconds.
+        :return: evaluated offspring, all of them unless the scheduler expired
+        """
+        done = 0
+        scheduler.start_batch()
+        while done < len(offspring) and not scheduler.expired():
+            chunk = offspring[done:done + scheduler.chunk_size(self.PREEMPT_INTERVAL, len(offspring) - done)]
+            start_time = time.monotonic()
+            evaluate_batch(chunk, self.evaluator, self.episodes)
+            scheduler.record(len(chunk), time.monotonic() - start_time)
+            self.simulated_turns += sum(ind.turns for ind in chunk)
+            if self.PRUNE_UNREACHED:
+                for ind in chunk:
+                    ind.prune_unreached()
+            done += len(chunk)
+        return offspring[:done]
+
+    def _breed(self, population: Population, count: int) -> List[Individual]:
+        offspring = []
+        while len(offspring) < count:
+            parents = population.select_parents()
+            first, second = copy.deepcopy(parents[0]), copy.deepcopy(parents[1])
+            crossed = random() < self.CROSSOVER_RATE
+            if crossed:
+                first.crossover(second)
+
+            mutated = random() < self.MUTATION_CHANCE
+            if mutated:
+                first.mutate(self)
+            offspring.append(self._finish_offspring(first, parents[0], crossed, mutated))
+            if len(offspring) < count:
+                mutated = random() < self.MUTATION_CHANCE
+                if mutated:
+                    second.mutate(self)
+                offspring.append(self._finish_offspring(second, parents[1], crossed, mutated))
+        return offspring
+
+    def _finish_offspring(self, ind: Individual, parent: Individual, crossed: bool = False,
+                          mutated: bool = False) -> Individual:
+        ind.prune()
+        if self.SIMPLIFY:
+            ind.simplify()
+        if not self.within_limits(ind.root):
+            ind = copy.deepcopy(parent)
+        # copies of parents are evaluated again in new games
+        ind.invalidate()
+        if self.operators is not None:
+            # operators are charged for offspring over limits too
+            self.operators.record(ind.uid, parent.fitness,
+                                  [op for op, used in ((adaptive.CROSSOVER, crossed), (adaptive.MUTATION, mutated))
+                                   if used])
+        return ind
+
+    def episodes(self) -> List[Episode]:
+        """
+        New evaluation games. Works for instance and class, Evolution.episodes(config).
+        """
+        return [Episode(randrange(self.SEED_RANGE), width, height)
+                for width, height in self.EVAL_BOARDS for _ in range(self.EVAL_SEEDS)]
+
+    def within_limits(self, root: Node) -> bool:
+        """
+        Works for instance and class, Evolution.within_limits(config, root).
+        """
+        return root.depth() <= self.MAX_DEPTH and root.size() <= self.MAX_SIZE
+
+    def _account_memory(self, log_handler, population: Population, generation: int):
+        if not (self.MEMORY_STATS or self.MEMORY_TOP or self.MEMORY_WARN or self.MEMORY_LIMIT):
+            return
+        from . import memory
+        record = memory.measure(population.pop, generation, self.behaviours.nbytes(),
+                                count_games=self.MEMORY_STATS, top=self.MEMORY_TOP)
+        log_handler.log_memory(record)
+        if self.MEMORY_WARN and memory.total(record) > self.MEMORY_WARN:
+            log_handler.warn_memory(record)
+        # traced memory hardly shrinks with the archive, pruning would not stop before it is empty
+        if self.MEMORY_LIMIT and memory.estimate(record) > self.MEMORY_LIMIT:
+            self.behaviours.prune(0.5)
+            log_handler.prune_history(record)
+
+    def _archive_evaluated(self, individuals: List[Individual], generation: int):
+        if self.archive is not None:
+            self.archive.add_evaluated(individuals, generation)
+
+    def _add_population(self, log_handler, population, generation):
+        if self.archive is not None:
+            self.archive.add_population(population, generation)
+        log_handler.add_population(population, generation)
 
-            log_handler.add_population(population, generation)
 
-        log_handler.log_time(time.time() - start_time)
+class LocalEvaluator:
+    """
+    Evaluate in this process, one individual after another.
+    """
+
+    def __init__(self, behaviour=False):
+        """
+        :param behaviour: record behaviour descriptors during evaluation (NOVELTY selection)
+        """
+        self.behaviour = behaviour
+
+    def evaluate(self, individuals: List[Individual], episodes: List[List[Episode]]):
+        """
+        :param episodes: evaluation games of each individual
+        """
+        for ind, ind_episodes in zip(individuals, episodes):
+            ind.calculate_fitness(ind_episodes, self.behaviour)
+
+
+def evaluate_batch(individuals: Sequence[Individual], evaluator=None, episodes=None) -> List[Individual]:
+    """
+    Evaluate individuals not evaluated yet, all in one batch.
+    :param evaluator: backend, LocalEvaluator by default
+    :param episodes: function returning new evaluation games of one individual,
+        one random game on the default board by default
+    :return: the evaluated individuals
+    """
+    pending = [ind for ind in individuals if not ind.evaluated]
+    if pending:
+        if episodes is None:
+            episodes = partial(list, [Episode(None, Game.WIDTH, Game.HEIGHT)])
+        evaluator = LocalEvaluator() if evaluator is None else evaluator
+        evaluator.evaluate(pending, [seeded(episodes()) for _ in pending])
+    return pending
 
 
 class LogHandler:
@@ -467,6 +1343,47 @@ class LogHandler:
     def log_time(self, d_time):
         pass
 
+    def log_surrogate(self, surrogate):
+        """
+        Called after each generation when surrogate screening is used.
+        """
+        pass
+
+    def log_operators(self, controller):
+        """
+        Called after evaluation of each generation with adaptive.OperatorController
+        when ADAPTIVE_OPERATORS is set.
+        """
+        pass
+
+    def log_diversity(self, diversity):
+        """
+        Called before add_population with diversity.Diversity of the generation
+        (measured before a restart).
+        """
+        pass
+
+    def log_memory(self, memory):
+        """
+        Called after add_population with memory.Memory of the generation
+        when memory accounting is enabled.
+        """
+        pass
+
+    def warn_memory(self, memory):
+        """
+        Memory used is over MEMORY_WARN.
+        """
+        print(f"Memory warning in generation {memory.generation}: population {memory.population} B, "
+              f"history {memory.history} B, traced {memory.traced} B")
+
+    def prune_history(self, memory):
+        """
+        Memory used is over MEMORY_LIMIT, drop what is kept of earlier generations.
+        Evolution has halved its novelty archive.
+        """
+        pass
+
 
 if __name__ == '__main__':
     Evolution.GENERATIONS = 10
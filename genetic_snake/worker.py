@@ -0,0 +1,149 @@
+"""
+Evolution running in a child process. Progress is streamed over a queue
+as compact per-generation summaries, so the GUI process only polls it.
+"""
+import multiprocessing
+import queue
+from collections import namedtuple
+from typing import List
+from .tree import Evolution, Individual, LogHandler, Population
+from .archive import Archive
+from . import encoding
+
+CONFIG = (
+    "RESTRICT_DEPTH",
+    "BASE_MUTATION_RATE",
+    "MUTATION_CHANCE",
+    "CROSSOVER_RATE",
+    "GENERATIONS",
+    "POPULATION_SIZE",
+    "MAX_RUNNING_TIME",
+    "TOURNAMENT_SIZE",
+    "EVALUATION_THREADS",
+)
+
+# message kinds
+SUMMARY = "summary"
+RUN = "run"
+FINISHED = "finished"
+
+
+class Summary(namedtuple("Summary", "generation avg_fitness avg_score "
+                                    "best_fitness best_score best_turns best_tree best_episodes top")):
+    """
+    Per-generation summary with the best tree in binary encoding and its evaluation games.
+    top holds the TOP best individuals as (tree, fitness, score, turns, episodes), for the gallery.
+    """
+    TOP = 20
+
+    @staticmethod
+    def of(population: Population, generation: int):
+        best = population.get_best()
+        top = sorted(population.pop, key=lambda ind: ind.fitness, reverse=True)[:Summary.TOP]
+        return Summary(generation, population.get_avg_fitness(), population.get_avg_score(),
+                       best.fitness, best.score, best.turns, encoding.dumps(best.root),
+                       tuple(best.episodes),
+                       tuple((encoding.dumps(ind.root), ind.fitness, ind.score, ind.turns, tuple(ind.episodes))
+                             for ind in top))
+
+    @staticmethod
+    def _individual(tree: bytes, fitness: float, score: int, turns: int, episodes) -> Individual:
+        ind = Individual(encoding.loads(tree))
+        ind.fitness = fitness
+        ind.score = score
+        ind.turns = turns
+        ind.episodes = list(episodes)
+        return ind
+
+    def best(self) -> Individual:
+        return self._individual(self.best_tree, self.best_fitness, self.best_score, self.best_turns,
+                                self.best_episodes)
+
+    def top_population(self) -> Population:
+        """
+        Population of the TOP best individuals only.
+        """
+        pop = Population()
+        for values in self.top:
+            pop.append(self._individual(*values))
+        return pop
+
+    def __str__(self):
+        return Population.SUMMARY.format(
+            self.avg_fitness, self.avg_score, self.best_fitness, self.best_score, self.best_turns
+        )
+
+
+def current_config() -> dict:
+    return {name: getattr(Evolution, name) for name in CONFIG}
+
+
+class QueueLogHandler(LogHandler):
+    def __init__(self, out: multiprocessing.Queue, evolution: Evolution):
+        self.out = out
+        self.evolution = evolution
+
+    def add_population(self, population, generation):
+        if generation == 0 and self.evolution.archive is not None:
+            self.out.put((RUN, self.evolution.archive.run))
+        self.out.put((SUMMARY, Summary.of(population, generation)))
+
+    def log_time(self, d_time):
+        self.out.put((FINISHED, d_time))
+
+
+def run(config: dict, out: multiprocessing.Queue, stop: multiprocessing.Event, archive_file: str = None):
+    """
+    Child process entry point.
+    """
+    archive = Archive(archive_file) if archive_file else None
+    evolution = Evolution(archive, stop=stop, **config)
+    try:
+        evolution.run(QueueLogHandler(out, evolution))
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+class EvolutionProcess:
+    """
+    Handle for evolution running in a child process.
+    stop() finishes after the chunk of individuals being evaluated (about
+    Evolution.PREEMPT_INTERVAL seconds), cancel() terminates immediately.
+    """
+
+    def __init__(self, archive_file: str = None):
+        context = multiprocessing.get_context("spawn")
+        self.config = current_config()
+        self.queue = context.Queue()
+        self.stop_event = context.Event()
+        self.process = context.Process(
+            target=run,
+            args=(self.config, self.queue, self.stop_event, archive_file),
+            daemon=True,
+        )
+
+    def start(self):
+        self.process.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def cancel(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def poll(self) -> List[tuple]:
+        """
+        Return all messages received so far, never blocks.
+        """
+        messages = []
+        while True:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages